@@ -6,6 +6,7 @@ from sqlalchemy import pool
 from alembic import context
 
 from db_setup import Base
+from partitions import DEFAULT_PARTITION, PARTITION_NAME
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -20,6 +21,33 @@ if config.config_file_name is not None:
 # for 'autogenerate' support
 target_metadata = Base.metadata
 
+# Objects the models describe differently from the real schema, which
+# autogenerate must leave alone. On Postgres SensorData is partitioned (see
+# partitions.py): its partitions are managed by partitions.py and hold the
+# (sensor_id, seq) unique index that the model declares on the table.
+SKIPPED_CONSTRAINTS = {"uq_SensorData_sensor_id_seq"}
+# The sensor search (see search.py) uses pg_trgm indexes where the extension
+# is available and an FTS5 table with its shadow tables on SQLite.
+SEARCH_INDEXES = {"ix_Sensors_name_trgm", "ix_Sensors_id_trgm"}
+SEARCH_TABLE = "SensorSearch"
+
+
+def include_name(name, type_, parent_names):
+    if type_ == "table":
+        return (
+            name != DEFAULT_PARTITION
+            and not PARTITION_NAME.match(name)
+            and not name.startswith(SEARCH_TABLE)
+        )
+    if type_ == "index":
+        return name not in SEARCH_INDEXES
+    return True
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    return name not in SKIPPED_CONSTRAINTS
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -42,6 +70,8 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_name=include_name,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -65,7 +95,10 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            include_name=include_name,
+            include_object=include_object,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,31 @@
+"""add seq to sensor data
+
+Revision ID: 4b7e2c9d1a53
+Revises: c39d1f45fd2f
+Create Date: 2026-10-17 10:12:31.402117
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "4b7e2c9d1a53"
+down_revision: Union[str, None] = "c39d1f45fd2f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("SensorData", sa.Column("seq", sa.BigInteger(), nullable=True))
+    # existing rows have no seq and NULLs never conflict
+    op.create_unique_constraint(
+        "uq_SensorData_sensor_id_seq", "SensorData", ["sensor_id", "seq"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_SensorData_sensor_id_seq", "SensorData", type_="unique")
+    op.drop_column("SensorData", "seq")
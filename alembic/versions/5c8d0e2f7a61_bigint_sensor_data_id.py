@@ -0,0 +1,87 @@
+"""bigint sensor data id and (sensor_id, created_at) index
+
+Revision ID: 5c8d0e2f7a61
+Revises: 9e1f6a7b3c28
+Create Date: 2026-10-17 12:26:09.571384
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "5c8d0e2f7a61"
+down_revision: Union[str, None] = "9e1f6a7b3c28"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 1. Number the existing readings in time order
+    op.add_column("SensorData", sa.Column("new_id", sa.BigInteger(), nullable=True))
+    op.execute("""
+        UPDATE "SensorData" AS d
+        SET new_id = n.rn
+        FROM (
+            SELECT id, row_number() OVER (ORDER BY created_at, id) AS rn
+            FROM "SensorData"
+        ) AS n
+        WHERE n.id = d.id
+        """)
+
+    # 2. Point the latest-reading columns at the new ids
+    op.add_column(
+        "Sensors", sa.Column("new_last_reading_id", sa.BigInteger(), nullable=True)
+    )
+    op.execute("""
+        UPDATE "Sensors" AS s
+        SET new_last_reading_id = d.new_id
+        FROM "SensorData" AS d
+        WHERE d.id = s.last_reading_id
+        """)
+    op.drop_column("Sensors", "last_reading_id")
+    op.alter_column("Sensors", "new_last_reading_id", new_column_name="last_reading_id")
+
+    # 3. Swap the primary key
+    op.drop_index("ix_SensorData_id", table_name="SensorData")
+    op.drop_constraint("SensorData_pkey", "SensorData", type_="primary")
+    op.drop_column("SensorData", "id")
+    op.alter_column("SensorData", "new_id", new_column_name="id", nullable=False)
+    op.create_primary_key("SensorData_pkey", "SensorData", ["id"])
+    op.execute(
+        'ALTER TABLE "SensorData" ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY'
+    )
+    op.execute("""
+        SELECT setval(
+            pg_get_serial_sequence('"SensorData"', 'id'),
+            COALESCE(MAX(id), 0) + 1,
+            false
+        )
+        FROM "SensorData"
+        """)
+
+    op.create_index(
+        "ix_SensorData_sensor_id_created_at",
+        "SensorData",
+        ["sensor_id", sa.text("created_at DESC")],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_SensorData_sensor_id_created_at", table_name="SensorData")
+    op.execute('ALTER TABLE "SensorData" ALTER COLUMN id DROP IDENTITY')
+    op.alter_column(
+        "SensorData",
+        "id",
+        type_=sa.String(),
+        postgresql_using="id::varchar",
+    )
+    op.create_index("ix_SensorData_id", "SensorData", ["id"])
+    op.alter_column(
+        "Sensors",
+        "last_reading_id",
+        type_=sa.String(),
+        postgresql_using="last_reading_id::varchar",
+    )
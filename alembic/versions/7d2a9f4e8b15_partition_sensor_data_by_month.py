@@ -0,0 +1,138 @@
+"""partition sensor data by month
+
+Revision ID: 7d2a9f4e8b15
+Revises: 5c8d0e2f7a61
+Create Date: 2026-10-17 14:02:47.130552
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7d2a9f4e8b15"
+down_revision: Union[str, None] = "5c8d0e2f7a61"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = "id, sensor_id, value, created_at, battery_value, seq"
+
+
+def upgrade() -> None:
+    op.execute('ALTER TABLE "SensorData" RENAME TO "SensorData_unpartitioned"')
+    op.execute("""
+        CREATE TABLE "SensorData" (
+            id BIGINT NOT NULL,
+            sensor_id VARCHAR REFERENCES "Sensors" (id),
+            value DOUBLE PRECISION NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            battery_value DOUBLE PRECISION,
+            seq BIGINT
+        ) PARTITION BY RANGE (created_at)
+        """)
+
+    # One partition per month from the oldest reading to a few months ahead,
+    # later months are created by partitions.py. A unique index across
+    # partitions must include created_at, so the (sensor_id, seq) dedup index
+    # lives on every partition instead.
+    op.execute("""
+        DO $$
+        DECLARE
+            month date;
+            name text;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc('month', LEAST(
+                        (SELECT min(created_at) FROM "SensorData_unpartitioned"),
+                        now() - interval '30 days'
+                    )),
+                    date_trunc('month', GREATEST(
+                        (SELECT max(created_at) FROM "SensorData_unpartitioned"),
+                        now() + interval '3 months'
+                    )),
+                    interval '1 month'
+                )::date
+            LOOP
+                name := 'SensorData_y' || to_char(month, 'YYYY')
+                    || 'm' || to_char(month, 'MM');
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF "SensorData" '
+                    'FOR VALUES FROM (%L) TO (%L)',
+                    name, month, (month + interval '1 month')::date
+                );
+                EXECUTE format(
+                    'CREATE UNIQUE INDEX %I ON %I (sensor_id, seq)',
+                    'uq_' || name || '_sensor_id_seq', name
+                );
+            END LOOP;
+        END $$
+        """)
+
+    # readings of deleted sensors would fail the foreign key; deleting a
+    # sensor through the ORM unlinks its readings the same way
+    op.execute(
+        'UPDATE "SensorData_unpartitioned" SET sensor_id = NULL '
+        'WHERE sensor_id NOT IN (SELECT id FROM "Sensors")'
+    )
+    op.execute(
+        f'INSERT INTO "SensorData" ({COLUMNS}) '
+        f'SELECT {COLUMNS} FROM "SensorData_unpartitioned"'
+    )
+    op.execute('DROP TABLE "SensorData_unpartitioned"')
+
+    op.execute('ALTER TABLE "SensorData" ADD PRIMARY KEY (id, created_at)')
+    op.execute(
+        'CREATE INDEX "ix_SensorData_sensor_id_created_at" '
+        'ON "SensorData" (sensor_id, created_at DESC)'
+    )
+    op.execute('CREATE SEQUENCE "SensorData_id_seq" OWNED BY "SensorData".id')
+    op.execute(
+        'ALTER TABLE "SensorData" '
+        "ALTER COLUMN id SET DEFAULT nextval('\"SensorData_id_seq\"')"
+    )
+    op.execute(
+        """SELECT setval('"SensorData_id_seq"', COALESCE(MAX(id), 0) + 1, false) """
+        'FROM "SensorData"'
+    )
+
+
+def downgrade() -> None:
+    op.execute('ALTER TABLE "SensorData" RENAME TO "SensorData_partitioned"')
+    op.execute('ALTER SEQUENCE "SensorData_id_seq" RENAME TO "SensorData_old_id_seq"')
+    op.execute("""
+        CREATE TABLE "SensorData" (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY,
+            sensor_id VARCHAR REFERENCES "Sensors" (id),
+            value DOUBLE PRECISION NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            battery_value DOUBLE PRECISION,
+            seq BIGINT
+        )
+        """)
+    op.execute(
+        f'INSERT INTO "SensorData" ({COLUMNS}) '
+        f'SELECT {COLUMNS} FROM "SensorData_partitioned"'
+    )
+    op.execute('DROP TABLE "SensorData_partitioned"')
+
+    op.execute(
+        'ALTER TABLE "SensorData" ADD CONSTRAINT "SensorData_pkey" PRIMARY KEY (id)'
+    )
+    op.execute(
+        'ALTER TABLE "SensorData" ADD CONSTRAINT "uq_SensorData_sensor_id_seq" '
+        "UNIQUE (sensor_id, seq)"
+    )
+    op.execute(
+        'CREATE INDEX "ix_SensorData_sensor_id_created_at" '
+        'ON "SensorData" (sensor_id, created_at DESC)'
+    )
+    op.execute("""
+        SELECT setval(
+            pg_get_serial_sequence('"SensorData"', 'id'),
+            COALESCE(MAX(id), 0) + 1,
+            false
+        )
+        FROM "SensorData"
+        """)
@@ -0,0 +1,49 @@
+"""add latest reading to sensors
+
+Revision ID: 9e1f6a7b3c28
+Revises: 4b7e2c9d1a53
+Create Date: 2026-10-17 11:04:52.918263
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "9e1f6a7b3c28"
+down_revision: Union[str, None] = "4b7e2c9d1a53"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("Sensors", sa.Column("last_value", sa.Float(), nullable=True))
+    op.add_column("Sensors", sa.Column("last_battery", sa.Float(), nullable=True))
+    op.add_column("Sensors", sa.Column("last_seen_at", sa.DateTime(), nullable=True))
+    op.add_column("Sensors", sa.Column("last_reading_id", sa.String(), nullable=True))
+
+    # backfill from the newest reading of every sensor
+    op.execute("""
+        UPDATE "Sensors" AS s
+        SET last_value = d.value,
+            last_battery = d.battery_value,
+            last_seen_at = d.created_at,
+            last_reading_id = d.id
+        FROM (
+            SELECT DISTINCT ON (sensor_id) sensor_id, id, value, battery_value,
+                created_at
+            FROM "SensorData"
+            WHERE sensor_id IS NOT NULL
+            ORDER BY sensor_id, created_at DESC
+        ) AS d
+        WHERE d.sensor_id = s.id
+        """)
+
+
+def downgrade() -> None:
+    op.drop_column("Sensors", "last_reading_id")
+    op.drop_column("Sensors", "last_seen_at")
+    op.drop_column("Sensors", "last_battery")
+    op.drop_column("Sensors", "last_value")
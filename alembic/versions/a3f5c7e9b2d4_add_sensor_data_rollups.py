@@ -0,0 +1,47 @@
+"""add sensor data rollups
+
+Revision ID: a3f5c7e9b2d4
+Revises: 7d2a9f4e8b15
+Create Date: 2026-10-17 15:40:18.662091
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "a3f5c7e9b2d4"
+down_revision: Union[str, None] = "7d2a9f4e8b15"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # rolls up the whole history on the first two runs of rollups.py
+    for table_name in ("SensorDataHourly", "SensorDataDaily"):
+        op.create_table(
+            table_name,
+            sa.Column("sensor_id", sa.String(), nullable=False),
+            sa.Column("bucket", sa.DateTime(), nullable=False),
+            sa.Column("min_value", sa.Float(), nullable=False),
+            sa.Column("max_value", sa.Float(), nullable=False),
+            sa.Column("avg_value", sa.Float(), nullable=False),
+            sa.Column("count", sa.Integer(), nullable=False),
+            sa.Column("last_battery", sa.Float(), nullable=True),
+            sa.PrimaryKeyConstraint("sensor_id", "bucket"),
+        )
+    op.create_table(
+        "RollupWatermark",
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("last_id", sa.BigInteger(), nullable=False),
+        sa.Column("pending_id", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("RollupWatermark")
+    op.drop_table("SensorDataDaily")
+    op.drop_table("SensorDataHourly")
@@ -0,0 +1,54 @@
+"""add sensor search trigram indexes
+
+Revision ID: b6d8e0f2a4c7
+Revises: a3f5c7e9b2d4
+Create Date: 2026-10-17 18:12:05.274913
+
+"""
+
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "b6d8e0f2a4c7"
+down_revision: Union[str, None] = "a3f5c7e9b2d4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+log = logging.getLogger("alembic.runtime.migration")
+
+INDEXES = {"ix_Sensors_name_trgm": "name", "ix_Sensors_id_trgm": "id"}
+
+
+def upgrade() -> None:
+    # pg_trgm ships with the contrib package, which a bare server may lack;
+    # search then keeps working, only without the index
+    available = (
+        op.get_bind()
+        .execute(
+            sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        )
+        .scalar()
+    )
+    if not available:
+        log.warning("pg_trgm is not available, skipping the sensor search indexes")
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for index_name, column_name in INDEXES.items():
+        op.create_index(
+            index_name,
+            "Sensors",
+            [column_name],
+            postgresql_using="gin",
+            postgresql_ops={column_name: "gin_trgm_ops"},
+        )
+
+
+def downgrade() -> None:
+    # the extension stays, other objects may depend on it
+    for index_name in INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS "{index_name}"')
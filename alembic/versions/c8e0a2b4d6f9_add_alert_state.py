@@ -0,0 +1,37 @@
+"""add alert state
+
+Revision ID: c8e0a2b4d6f9
+Revises: b6d8e0f2a4c7
+Create Date: 2026-10-17 20:31:44.508126
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "c8e0a2b4d6f9"
+down_revision: Union[str, None] = "b6d8e0f2a4c7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # starts empty: alerts that are raised already get notified once more
+    op.create_table(
+        "AlertState",
+        sa.Column("sensor_id", sa.String(), nullable=False),
+        sa.Column("alert", sa.String(), nullable=False),
+        sa.Column("active", sa.Boolean(), nullable=False),
+        sa.Column("changed_at", sa.DateTime(), nullable=True),
+        sa.Column("notified_at", sa.DateTime(), nullable=True),
+        sa.Column("cooldown_until", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["sensor_id"], ["Sensors.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("sensor_id", "alert"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("AlertState")
@@ -0,0 +1,63 @@
+"""add sensor data default partition
+
+Revision ID: e4f6a8c0b2d5
+Revises: c8e0a2b4d6f9
+Create Date: 2026-10-17 22:10:05.412987
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e4f6a8c0b2d5"
+down_revision: Union[str, None] = "c8e0a2b4d6f9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = "id, sensor_id, value, created_at, battery_value, seq"
+
+
+def upgrade() -> None:
+    # Catches readings of months without a partition, so ingest keeps working
+    # when partitions.py did not run in time; it moves them out later.
+    op.execute('CREATE TABLE "SensorData_default" PARTITION OF "SensorData" DEFAULT')
+    op.execute(
+        'CREATE UNIQUE INDEX "uq_SensorData_default_sensor_id_seq" '
+        'ON "SensorData_default" (sensor_id, seq)'
+    )
+
+
+def downgrade() -> None:
+    op.execute('ALTER TABLE "SensorData" DETACH PARTITION "SensorData_default"')
+    # the rows it still holds go to month partitions created for them
+    op.execute("""
+        DO $$
+        DECLARE
+            month date;
+            name text;
+        BEGIN
+            FOR month IN
+                SELECT DISTINCT date_trunc('month', created_at)::date
+                FROM "SensorData_default"
+            LOOP
+                name := 'SensorData_y' || to_char(month, 'YYYY')
+                    || 'm' || to_char(month, 'MM');
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF "SensorData" '
+                    'FOR VALUES FROM (%L) TO (%L)',
+                    name, month, (month + interval '1 month')::date
+                );
+                EXECUTE format(
+                    'CREATE UNIQUE INDEX %I ON %I (sensor_id, seq)',
+                    'uq_' || name || '_sensor_id_seq', name
+                );
+            END LOOP;
+        END $$
+        """)
+    op.execute(
+        f'INSERT INTO "SensorData" ({COLUMNS}) '
+        f'SELECT {COLUMNS} FROM "SensorData_default"'
+    )
+    op.execute('DROP TABLE "SensorData_default"')
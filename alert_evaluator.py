@@ -0,0 +1,390 @@
+"""Event-driven alert evaluation in the API process.
+
+Every committed reading is handed to ``alert_evaluator`` by the ingest path.
+It keeps a ring buffer of the newest SAMPLES_TO_AVERAGE readings per sensor,
+so new readings cost no query for their history: the averages are updated in
+memory and a status change is written and pushed right away instead of on
+the next alert service cycle. Alerts are raised and cleared in AlertState, and notified
+under the same hysteresis and cooldown as the alert service. A sensor's
+buffer is loaded from the database the first time one of its readings
+arrives, and again after ``forget``.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import alert_service
+from alert_service import (
+    LOW_BATTERY_ALERT,
+    RED_ALERT,
+    SAMPLES_TO_AVERAGE,
+    SensorSummary,
+    alert_states_query,
+    classify,
+    is_low_battery,
+    last_readings,
+    set_alert,
+)
+from db_setup import AlertState, AsyncSessionLocal, Sensors, StatusChoices
+from pubsub import broker, status_event
+from utils import utc_now
+from versions import data_versions
+
+log = logging.getLogger(__name__)
+
+
+class SensorWindow:
+    """Ring buffer of the newest readings of one sensor, oldest first."""
+
+    def __init__(self, size: int):
+        # (created_at, id, value, battery_value)
+        self.readings: deque[tuple[datetime, int, float, float | None]] = deque(
+            maxlen=size
+        )
+
+    def add(self, created_at: datetime, id: int, value: float, battery_value) -> bool:
+        """Adds a reading, returns False when it changes nothing."""
+        reading = (created_at, id, value, battery_value)
+        readings = self.readings
+        if not readings or created_at >= readings[-1][0]:
+            if any(stored[1] == id for stored in readings):
+                return False
+            readings.append(reading)
+            return True
+        # a late upload of buffered readings
+        if len(readings) == readings.maxlen and created_at < readings[0][0]:
+            return False
+        if any(stored[1] == id for stored in readings):
+            return False
+        ordered = sorted([*readings, reading], key=lambda stored: stored[0])
+        readings.clear()
+        readings.extend(ordered)
+        return True
+
+    @property
+    def value_sum(self) -> float:
+        return sum(reading[2] for reading in self.readings)
+
+    @property
+    def battery_sum(self) -> float:
+        return sum(reading[3] or 0 for reading in self.readings)
+
+
+@dataclass(eq=False)
+class SensorState:
+    sensor: Sensors
+    window: SensorWindow
+    # AlertState.alert of the raised alerts
+    alerts: frozenset[str] = frozenset()
+    changed: bool = field(default=False, repr=False)
+
+    def summary(self) -> SensorSummary:
+        return SensorSummary(
+            sensor=self.sensor,
+            value_sum=self.window.value_sum,
+            battery_sum=self.window.battery_sum,
+        )
+
+
+class AlertEvaluator:
+    """Applies the alert service's threshold and battery checks per reading.
+
+    ``observe`` only queues the rows, so ingest never waits for it; a
+    background task evaluates everything queued at once. Only inactive
+    sensors are skipped, like the alert service's periodic run does.
+    """
+
+    def __init__(self, samples: int = SAMPLES_TO_AVERAGE):
+        self.samples = samples
+        self._states: dict[str, SensorState] = {}
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        # evaluations mutate the cached states, one at a time
+        self._lock = asyncio.Lock()
+        self.evaluated = 0
+        self.transitions = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._states = {}
+        self._task = asyncio.create_task(self._run())
+        log.info("Alert evaluator started")
+
+    async def stop(self):
+        """Evaluates what is still queued, then stops."""
+        if not self.running:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+        log.info("Alert evaluator stopped")
+
+    def observe(self, rows: list[dict]):
+        """Queues committed SensorData rows for evaluation."""
+        if self.running and rows:
+            self._queue.put_nowait(rows)
+
+    def forget(self, *sensor_ids: str):
+        """Drops cached sensors, or all of them; they reload on their next reading."""
+        if not sensor_ids:
+            self._states.clear()
+        for sensor_id in sensor_ids:
+            self._states.pop(sensor_id, None)
+
+    async def _run(self):
+        while True:
+            batches = [await self._queue.get()]
+            while not self._queue.empty():
+                batches.append(self._queue.get_nowait())
+            rows = [row for batch in batches if batch is not None for row in batch]
+            if rows:
+                try:
+                    async with self._lock:
+                        await self._evaluate(rows)
+                except Exception:
+                    # the task must outlive any error, or alerting stops
+                    log.exception("Alert evaluation of %s readings failed", len(rows))
+                    # their cached state may be half updated
+                    self.forget(*{row["sensor_id"] for row in rows})
+            if None in batches:
+                return
+
+    async def reevaluate(self, sensor_id: str):
+        """Reloads one sensor from the database and checks it again."""
+        async with self._lock:
+            self.forget(sensor_id)
+            try:
+                await self._evaluate([], [sensor_id])
+            except Exception:
+                self.forget(sensor_id)
+                raise
+
+    async def _evaluate(self, rows: list[dict], sensor_ids=()):
+        async with AsyncSessionLocal() as db:
+            touched = []
+            unknown = {row["sensor_id"] for row in rows}.union(sensor_ids)
+            unknown -= self._states.keys()
+            if unknown:
+                # loaded with the new readings already in their window
+                for state in await self._load(db, unknown):
+                    if state.sensor.active:
+                        state.changed = True
+                        touched.append(state)
+
+            cached = []
+            for row in rows:
+                state = self._states.get(row["sensor_id"])
+                if state is None:
+                    continue
+                if state.window.add(
+                    row["created_at"], row["id"], row["value"], row["battery_value"]
+                ):
+                    if not state.changed:
+                        state.changed = True
+                        touched.append(state)
+                        cached.append(state)
+            if cached:
+                await self._refresh(db, cached)
+
+            changed = []
+            alerting = []
+            stale = []
+            for state in touched:
+                state.changed = False
+                if not state.sensor.active:
+                    continue
+                self.evaluated += 1
+                summary = state.summary()
+                status = classify(summary)
+                if status is not None and status != state.sensor.status:
+                    if not await self._set_status(db, state.sensor, status):
+                        # the cache is stale: the sensor went inactive or
+                        # changed meanwhile; it reloads on its next reading
+                        stale.append(state.sensor.id)
+                        continue
+                    changed.append(state.sensor)
+                alerts = set()
+                if state.sensor.status == StatusChoices.RED:
+                    alerts.add(RED_ALERT)
+                if is_low_battery(summary, LOW_BATTERY_ALERT in state.alerts):
+                    alerts.add(LOW_BATTERY_ALERT)
+                if alerts != state.alerts:
+                    alerting.append((state, frozenset(alerts)))
+            notified = await self._set_alerts(db, alerting)
+            await db.commit()
+        if stale:
+            self.forget(*stale)
+
+        for sensor in changed:
+            log.info("Sensor %s is now %s", sensor.name, sensor.status.value)
+            data_versions.bump(sensor.id)
+            if broker.subscribers:
+                broker.publish(
+                    "status",
+                    status_event(sensor.id, sensor.name, sensor.status, sensor.active),
+                )
+        self.transitions += len(changed)
+
+        alert_service.notify_red_alerts(notified[RED_ALERT])
+        alert_service.notify_low_battery(notified[LOW_BATTERY_ALERT])
+
+    @staticmethod
+    async def _set_alerts(
+        db: AsyncSession, alerting: list[tuple[SensorState, frozenset[str]]]
+    ) -> dict[str, list[str]]:
+        """Raises and clears alerts in AlertState, returns the names to notify.
+
+        Sensors the database has as inactive by now are skipped, like the
+        status update skips them.
+        """
+        notified = {RED_ALERT: [], LOW_BATTERY_ALERT: []}
+        if not alerting:
+            return notified
+        sensor_ids = [state.sensor.id for state, _ in alerting]
+        active = set(
+            (
+                await db.execute(
+                    select(Sensors.id).where(
+                        Sensors.id.in_(sensor_ids), Sensors.active == True
+                    )
+                )
+            ).scalars()
+        )
+        states = {
+            (alert_state.sensor_id, alert_state.alert): alert_state
+            for alert_state in (
+                await db.execute(alert_states_query(sensor_ids))
+            ).scalars()
+        }
+        now = utc_now()
+        for state, alerts in alerting:
+            if state.sensor.id not in active:
+                state.sensor.active = False
+                continue
+            for alert, names in notified.items():
+                if set_alert(db, states, state.sensor.id, alert, alert in alerts, now):
+                    names.append(state.sensor.name)
+            state.alerts = alerts
+        return notified
+
+    @staticmethod
+    async def _refresh(db: AsyncSession, states: list[SensorState]):
+        """Reloads status and activity of cached sensors.
+
+        The alert service marks sensors missing and ingest reactivates them
+        behind the cache's back; one query per evaluation keeps up with both.
+        """
+        current = {
+            sensor_id: (status, active)
+            for sensor_id, status, active in await db.execute(
+                select(Sensors.id, Sensors.status, Sensors.active).where(
+                    Sensors.id.in_([state.sensor.id for state in states])
+                )
+            )
+        }
+        for state in states:
+            if state.sensor.id in current:
+                state.sensor.status, state.sensor.active = current[state.sensor.id]
+
+    @staticmethod
+    async def _set_status(
+        db: AsyncSession, sensor: Sensors, status: StatusChoices
+    ) -> bool:
+        """Writes a status change, returns False when it did not apply.
+
+        The database stays the source of truth: the update only applies to an
+        active sensor whose stored status differs, so a stale cache (a sensor
+        marked missing by the alert service meanwhile) writes nothing and
+        the cached sensor is left as it is.
+        """
+        changed = (
+            await db.execute(
+                update(Sensors)
+                .where(
+                    Sensors.id == sensor.id,
+                    Sensors.active == True,
+                    Sensors.status != status,
+                )
+                .values(status=status)
+                .returning(Sensors.id)
+            )
+        ).first()
+        if changed is None:
+            return False
+        sensor.status = status
+        return True
+
+    async def _load(self, db: AsyncSession, sensor_ids: set[str]) -> list[SensorState]:
+        sensors = (
+            await db.execute(select(Sensors).where(Sensors.id.in_(sensor_ids)))
+        ).scalars()
+        states = {
+            sensor.id: SensorState(sensor=sensor, window=SensorWindow(self.samples))
+            for sensor in sensors
+        }
+        db.expunge_all()
+
+        recent, onclause = last_readings(db.bind.dialect.name)
+        readings = await db.execute(
+            select(
+                Sensors.id,
+                recent.c.created_at,
+                recent.c.id,
+                recent.c.value,
+                recent.c.battery_value,
+            )
+            .join(recent, onclause)
+            .where(Sensors.id.in_(states))
+        )
+        for sensor_id, *reading in readings:
+            states[sensor_id].window.add(*reading)
+        raised = await db.execute(
+            select(AlertState.sensor_id, AlertState.alert).where(
+                AlertState.sensor_id.in_(states), AlertState.active == True
+            )
+        )
+        for sensor_id, alert in raised:
+            states[sensor_id].alerts |= {alert}
+        self._states.update(states)
+        return list(states.values())
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "sensors": len(self._states),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "evaluated": self.evaluated,
+            "transitions": self.transitions,
+        }
+
+
+alert_evaluator = AlertEvaluator()
+
+
+async def reevaluate_sensor(sensor_id: str):
+    """Runs the alert checks of one sensor again, after it was updated."""
+    if alert_evaluator.running:
+        await alert_evaluator.reevaluate(sensor_id)
+        return
+
+    # the alert service is synchronous; keep it off the event loop
+    await asyncio.to_thread(alert_service.run_update_alerts, sensor_id)
+    data_versions.bump(sensor_id)
+    if broker.subscribers:
+        async with AsyncSessionLocal() as db:
+            sensor = await db.get(Sensors, sensor_id)
+        if sensor is not None:
+            broker.publish(
+                "status",
+                status_event(sensor.id, sensor.name, sensor.status, sensor.active),
+            )
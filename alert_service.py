@@ -6,20 +6,29 @@ import logging
 import time
 from datetime import datetime, timedelta
 
-import requests
+from sqlalchemy import func, or_, select, true, update
 
-from db_setup import SessionLocal, StatusChoices
+from db_setup import AlertState, SessionLocal, StatusChoices
 from db_setup import Sensors, SensorData
-
-from utils import get_value_percentage
+from notifications import notify, ntfy
+from partitions import maintain_partitions
+from rollups import run_update_rollups
+from settings import (
+    ALERT_COOLDOWN_SECONDS,
+    ALERT_HYSTERESIS_PERCENT,
+    ALERTS_ON_INGEST,
+    LOW_BATTERY_HYSTERESIS,
+    MISSING_SENSOR_THRESHOLD_SECONDS,
+)
+
+from utils import get_value_percentage, utc_now
 
 LOW_BATT_VALUE = 30000
+# AlertState.alert values
+RED_ALERT = "red"
+LOW_BATTERY_ALERT = "low_battery"
 
 SLEEP_TIME = 300
-NTFY_URL = "http://pi-server:80/"
-NTFY_TOPIC = "moisture_sensor"
-# MISSING_SENSOR_THRESHOLD_TIME_SECONDS = 86400 # 1 day
-MISSING_SENSOR_THRESHOLD_TIME_SECONDS = 1 * 60 * 60
 SAMPLES_TO_AVERAGE = 3
 
 log = logging.getLogger(__name__)
@@ -30,81 +39,220 @@ def get_db_session():
     return db
 
 
-def check_for_missing_devices(sensors, db=None):
-    # Should find any device that hasn't updated in a specified interval.
-    # check for the latest SensorData for each Sensor and if it's older than a day, send an alert.
-    if not db:
-        db = get_db_session()
-
-    missing_sensors = []
-    for sensor in sensors:
-        latest_data = (
-            db.query(SensorData)
-            .filter(SensorData.sensor_id == sensor.id)
+@dataclass
+class SensorSummary:
+    """An active sensor with the sums of its last SAMPLES_TO_AVERAGE readings."""
+
+    sensor: Sensors
+    value_sum: float
+    battery_sum: float
+
+    @property
+    def last_seen_at(self) -> datetime | None:
+        return self.sensor.last_seen_at
+
+    @property
+    def average_value(self) -> float:
+        return self.value_sum / SAMPLES_TO_AVERAGE
+
+    @property
+    def average_battery(self) -> float:
+        # readings without a battery value count as zero
+        return self.battery_sum / SAMPLES_TO_AVERAGE
+
+
+def last_readings(dialect_name: str):
+    """The newest SAMPLES_TO_AVERAGE readings of every sensor.
+
+    Returns the selectable and the clause joining it to Sensors.
+    """
+    if dialect_name == "postgresql":
+        # one short index scan per sensor, instead of ranking the whole history
+        recent = (
+            select(
+                SensorData.id,
+                SensorData.created_at,
+                SensorData.value,
+                SensorData.battery_value,
+            )
+            .where(SensorData.sensor_id == Sensors.id)
             .order_by(SensorData.created_at.desc())
-            .first()
+            .limit(SAMPLES_TO_AVERAGE)
+            .lateral("recent")
         )
-        latest_sensor_data_datetime = latest_data.created_at
-        if latest_data and latest_sensor_data_datetime > (
-            datetime.now() - timedelta(seconds=MISSING_SENSOR_THRESHOLD_TIME_SECONDS)
-        ):
-            continue
-        else:
-            missing_sensors.append(sensor)
-    return missing_sensors
+        return recent, true()
+
+    ranked = select(
+        SensorData.sensor_id,
+        SensorData.id,
+        SensorData.created_at,
+        SensorData.value,
+        SensorData.battery_value,
+        func.row_number()
+        .over(partition_by=SensorData.sensor_id, order_by=SensorData.created_at.desc())
+        .label("rank"),
+    ).subquery("ranked")
+    recent = (
+        select(ranked).where(ranked.c.rank <= SAMPLES_TO_AVERAGE).subquery("recent")
+    )
+    return recent, recent.c.sensor_id == Sensors.id
+
+
+def summarize_sensors(db, sensor_id: str | None = None) -> list[SensorSummary]:
+    """Everything the alert checks need about the active sensors, in one query.
+
+    Pass ``sensor_id`` to summarize that sensor only.
+    """
+    recent, onclause = last_readings(db.bind.dialect.name)
+    query = (
+        select(
+            Sensors,
+            func.coalesce(func.sum(recent.c.value), 0),
+            func.coalesce(func.sum(recent.c.battery_value), 0),
+        )
+        .outerjoin(recent, onclause)
+        .where(Sensors.active == True)
+        .group_by(Sensors.id)
+    )
+    if sensor_id is not None:
+        query = query.where(Sensors.id == sensor_id)
+    rows = db.execute(query).all()
+    return [
+        SensorSummary(sensor=sensor, value_sum=value_sum, battery_sum=battery_sum)
+        for sensor, value_sum, battery_sum in rows
+    ]
+
 
+def missing_cutoff() -> datetime:
+    """Sensors last seen at or before this time are missing."""
+    return utc_now() - timedelta(seconds=MISSING_SENSOR_THRESHOLD_SECONDS)
 
-def check_for_threshold_breaches(sensors, db=None):
-    # Should check if any SensorData value is above the threshold and send an alert.
-    if not db:
-        db = get_db_session()
 
+def check_for_missing_devices(summaries: list[SensorSummary]) -> list[Sensors]:
+    # Should find any device that hasn't updated in a specified interval.
+    cutoff = missing_cutoff()
+    return [
+        summary.sensor
+        for summary in summaries
+        if summary.last_seen_at is None or summary.last_seen_at <= cutoff
+    ]
+
+
+def classify(summary: SensorSummary) -> StatusChoices | None:
+    """Status for the recent average, None while there is nothing to average.
+
+    The thresholds move ALERT_HYSTERESIS_PERCENT away from the sensor's
+    current status, so an average hovering at a threshold does not flap.
+    """
+    # convert to percentage
+    average_of_past_x_samples = get_value_percentage(summary.average_value)
+    threshold_green = summary.sensor.threshold_green
+    threshold_yellow = summary.sensor.threshold_yellow
+    band = ALERT_HYSTERESIS_PERCENT
+    if summary.sensor.status == StatusChoices.GREEN:
+        threshold_green -= band
+        threshold_yellow -= band
+    elif summary.sensor.status == StatusChoices.YELLOW:
+        threshold_green += band
+        threshold_yellow -= band
+    elif summary.sensor.status == StatusChoices.RED:
+        threshold_green += band
+        threshold_yellow += band
+
+    if average_of_past_x_samples > threshold_green:
+        return StatusChoices.GREEN
+    elif average_of_past_x_samples > threshold_yellow:
+        return StatusChoices.YELLOW
+    elif average_of_past_x_samples > 0:
+        return StatusChoices.RED
+    return None
+
+
+def is_low_battery(summary: SensorSummary, currently_low: bool = False) -> bool:
+    # a low battery has to recover past the band to count as fixed
+    if currently_low:
+        return summary.average_battery < LOW_BATT_VALUE + LOW_BATTERY_HYSTERESIS
+    return summary.average_battery < LOW_BATT_VALUE
+
+
+def alert_states_query(sensor_ids):
+    return select(AlertState).where(AlertState.sensor_id.in_(sensor_ids))
+
+
+def update_alert_state(state: AlertState, active: bool, now: datetime) -> bool:
+    """Records whether an alert is raised; True when it has to be notified."""
+    if state.active == active:
+        return False
+    state.active = active
+    state.changed_at = now
+    if not active:
+        return False
+    if state.cooldown_until is not None and now < state.cooldown_until:
+        log.info("Alert %s of %s is cooling down", state.alert, state.sensor_id)
+        return False
+    state.notified_at = now
+    state.cooldown_until = now + timedelta(seconds=ALERT_COOLDOWN_SECONDS)
+    return True
+
+
+def set_alert(
+    db, states: dict, sensor_id: str, alert: str, active: bool, now: datetime
+) -> bool:
+    """``update_alert_state`` on the loaded ``states``, adding missing rows.
+
+    ``states`` maps (sensor_id, alert) to AlertState. A sensor without a row
+    has never raised the alert, so a row is only added to raise it.
+    """
+    state = states.get((sensor_id, alert))
+    if state is None:
+        if not active:
+            return False
+        state = AlertState(sensor_id=sensor_id, alert=alert, active=False)
+        db.add(state)
+        states[(sensor_id, alert)] = state
+    return update_alert_state(state, active, now)
+
+
+def check_for_threshold_breaches(summaries: list[SensorSummary]):
+    # Should check if the recent average is below a threshold and send an alert.
     red_alerts = []
     yellow_alerts = []
     status_greens = []
-    for sensor in sensors:
-        readings = (
-            db.query(SensorData)
-            .join(Sensors, SensorData.sensor_id == Sensors.id)
-            .filter(SensorData.sensor_id == sensor.id)
-            .order_by(SensorData.created_at.desc())
-            .limit(SAMPLES_TO_AVERAGE)
-            .all()
-        )
-
-        average_of_past_x_samples = (
-            sum([data.value for data in readings]) / SAMPLES_TO_AVERAGE
-        )
-        # convert to percentage
-        average_of_past_x_samples = get_value_percentage(average_of_past_x_samples)
+    for summary in summaries:
         log.info(
             "Sensor %s: Average of past %s samples: %s",
-            sensor.name,
+            summary.sensor.name,
             SAMPLES_TO_AVERAGE,
-            average_of_past_x_samples,
+            get_value_percentage(summary.average_value),
         )
-        if average_of_past_x_samples > sensor.threshold_green:
-            status_greens.append(sensor)
-        elif average_of_past_x_samples > sensor.threshold_yellow:
-            yellow_alerts.append(sensor)
-        elif average_of_past_x_samples > 0:
-            red_alerts.append(sensor)
+        status = classify(summary)
+        if status == StatusChoices.GREEN:
+            status_greens.append(summary.sensor)
+        elif status == StatusChoices.YELLOW:
+            yellow_alerts.append(summary.sensor)
+        elif status == StatusChoices.RED:
+            red_alerts.append(summary.sensor)
     return red_alerts, yellow_alerts, status_greens
 
 
-def send_ntfy_message(
-    message,
-    priority: int = 1,
-    title: str = "Moisture Sensor Alert",
-    tags: str = "alien",
-):
-    headers = {
-        "Title": title,
-        "Priority": str(priority),  # 1-5 with 5 being the highest
-        "Tags": tags,
-    }
-    response = requests.post(f"{NTFY_URL}{NTFY_TOPIC}", headers=headers, data=message)
-    print(response.status_code, response.text)
+def notify_red_alerts(sensor_names: list[str]):
+    notify(
+        "Red Alert",
+        "The following sensors have breached their red threshold:",
+        sensor_names,
+        priority=3,
+        tags="fire",
+    )
+
+
+def notify_low_battery(sensor_names: list[str]):
+    notify(
+        "Low Battery",
+        "The following sensors have low battery:",
+        sensor_names,
+        priority=2,
+        tags="battery",
+    )
 
 
 @dataclass
@@ -113,46 +261,30 @@ class LowBatterySensor:
     battery_value: float
 
 
-def check_for_low_battery(sensors, db=None) -> list[LowBatterySensor]:
-    if not db:
-        db = get_db_session()
-
-    sensors_with_low_battery = []
-    for sensor in sensors:
-        # Check last 3 sensor data records for battery value
-        readings = (
-            db.query(SensorData)
-            .join(Sensors, SensorData.sensor_id == Sensors.id)
-            .filter(SensorData.sensor_id == sensor.id)
-            .order_by(SensorData.created_at.desc())
-            .limit(SAMPLES_TO_AVERAGE)
-            .all()
-        )
-
-        average_of_past_x_samples = (
-            sum(
-                [
-                    data.battery_value
-                    for data in readings
-                    if data.battery_value is not None
-                ]
-            )
-            / SAMPLES_TO_AVERAGE
-        )
-        if average_of_past_x_samples < LOW_BATT_VALUE:
-            sensors_with_low_battery.append(
-                LowBatterySensor(sensor=sensor, battery_value=average_of_past_x_samples)
-            )
-
-    return sensors_with_low_battery
+def check_for_low_battery(
+    summaries: list[SensorSummary], currently_low: set[str] = frozenset()
+) -> list[LowBatterySensor]:
+    return [
+        LowBatterySensor(sensor=summary.sensor, battery_value=summary.average_battery)
+        for summary in summaries
+        if is_low_battery(summary, summary.sensor.id in currently_low)
+    ]
 
 
-def run_update_alerts():
+def run_update_alerts(sensor_id: str | None = None):
+    """Runs every alert check on all active sensors, or on one of them."""
     log.info("Checking for missing sensors & threshold breaches")
     db = get_db_session()
-    sensors = db.query(Sensors).filter(Sensors.active == True)
+    now = utc_now()
+    summaries = summarize_sensors(db, sensor_id)
+    states = {
+        (state.sensor_id, state.alert): state
+        for state in db.execute(
+            alert_states_query([summary.sensor.id for summary in summaries])
+        ).scalars()
+    }
 
-    missing_sensors = check_for_missing_devices(sensors, db)
+    missing_sensors = check_for_missing_devices(summaries)
     log.info("Missing sensors: %s", missing_sensors)
     sensor_names = [
         sensor.name
@@ -161,29 +293,17 @@ def run_update_alerts():
     ]
     # if missing_sensors:
     #     send_ntfy_message(
-    #         f"The following sensors have not reported in over {MISSING_SENSOR_THRESHOLD_TIME_SECONDS} seconds: {''.join(sensor_names)}. Marking sensor as inactive.",
+    #         f"The following sensors have not reported in over {MISSING_SENSOR_THRESHOLD_SECONDS} seconds: {''.join(sensor_names)}. Marking sensor as inactive.",
     #         priority=3,
     #         title="Missing Moisture Sensors",
     #         tags="see_no_evil",
     #     )
     log.info("Sent missing sensor alerts")
 
-    red_alerts, yellow_alerts, status_greens = check_for_threshold_breaches(sensors, db)
+    red_alerts, yellow_alerts, status_greens = check_for_threshold_breaches(summaries)
     log.info("Red alerts: %s", red_alerts)
     log.info("Yellow alerts: %s", yellow_alerts)
 
-    if red_alerts:
-        sensor_names = [
-            sensor.name for sensor in red_alerts if sensor.status != StatusChoices.RED
-        ]
-        send_ntfy_message(
-            f"The following sensors have breached their red threshold:\n {'\n'.join(sensor_names)}",
-            priority=3,
-            title="Red Alert",
-            tags="fire",
-        )
-        log.info("Sent red alerts")
-
     # if yellow_alerts:
     #     sensor_names = [sensor.name for sensor in yellow_alerts if sensor.status != StatusChoices.YELLOW]
     #     send_ntfy_message(
@@ -195,38 +315,113 @@ def run_update_alerts():
     #     log.info("Sent yellow alerts")
     #
 
-    low_bat_sensors = check_for_low_battery(sensors, db)
-    if low_bat_sensors:
-        sensor_names = [sensor.sensor.name for sensor in low_bat_sensors]
-        send_ntfy_message(
-            f"The following sensors have low battery:\n {'\n'.join(sensor_names)}\n",
-            priority=2,
-            title="Low Battery",
-            tags="battery",
-        )
-        log.info("Sent low battery alerts")
+    currently_low = {
+        state.sensor_id
+        for state in states.values()
+        if state.alert == LOW_BATTERY_ALERT and state.active
+    }
+    low_bat_sensors = check_for_low_battery(summaries, currently_low)
 
-    # save statuses to the database
+    # save status changes only, missing wins over any threshold
+    statuses = {}
     for sensor in red_alerts:
-        sensor.status = StatusChoices.RED
-        sensor.active = True
+        statuses[sensor] = StatusChoices.RED
     for sensor in yellow_alerts:
-        sensor.status = StatusChoices.YELLOW
-        sensor.active = True
+        statuses[sensor] = StatusChoices.YELLOW
     for sensor in status_greens:
-        sensor.status = StatusChoices.GREEN
-        sensor.active = True
+        statuses[sensor] = StatusChoices.GREEN
     for sensor in missing_sensors:
-        sensor.status = StatusChoices.BLACK
-        sensor.active = False
+        statuses[sensor] = StatusChoices.BLACK
+    for sensor, status in statuses.items():
+        active = status != StatusChoices.BLACK
+        if sensor.status != status or sensor.active != active:
+            sensor.status = status
+            sensor.active = active
+
+    # only alerts that are newly raised get notified
+    low_battery = {item.sensor for item in low_bat_sensors} - set(missing_sensors)
+    red_names = []
+    low_battery_names = []
+    for summary in summaries:
+        sensor = summary.sensor
+        if set_alert(
+            db, states, sensor.id, RED_ALERT, sensor.status == StatusChoices.RED, now
+        ):
+            red_names.append(sensor.name)
+        if set_alert(
+            db, states, sensor.id, LOW_BATTERY_ALERT, sensor in low_battery, now
+        ):
+            low_battery_names.append(sensor.name)
 
     db.commit()
     db.close()
 
+    notify_red_alerts(red_names)
+    notify_low_battery(low_battery_names)
+    log.info(
+        "Queued %s red and %s low battery alerts",
+        len(red_names),
+        len(low_battery_names),
+    )
+
+
+def run_missing_sweep():
+    """Marks the active sensors that stopped reporting as missing.
+
+    With ALERTS_ON_INGEST the API evaluates thresholds and battery as readings
+    arrive (see alert_evaluator.py); a sensor going quiet is the one thing
+    that has to be polled for.
+    """
+    log.info("Checking for missing sensors")
+    db = get_db_session()
+    try:
+        cutoff = missing_cutoff()
+        missing_sensors = (
+            db.execute(
+                select(Sensors).where(
+                    Sensors.active == True,
+                    or_(Sensors.last_seen_at.is_(None), Sensors.last_seen_at <= cutoff),
+                )
+            )
+            .scalars()
+            .all()
+        )
+        log.info("Missing sensors: %s", missing_sensors)
+        for sensor in missing_sensors:
+            sensor.status = StatusChoices.BLACK
+            sensor.active = False
+        if missing_sensors:
+            # a missing sensor is neither red nor low on battery any more
+            db.execute(
+                update(AlertState)
+                .where(
+                    AlertState.sensor_id.in_([sensor.id for sensor in missing_sensors]),
+                    AlertState.active == True,
+                )
+                .values(active=False, changed_at=utc_now())
+            )
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_step(step):
+    """Runs one step of the loop, logging instead of raising its errors."""
+    try:
+        step()
+    except Exception:
+        log.exception("%s failed", step.__name__)
+
 
 def main_event_loop():
     while True:
-        run_update_alerts()
+        # a failing maintenance step must not stop the alert checks
+        run_step(maintain_partitions)
+        run_step(run_update_rollups)
+        if ALERTS_ON_INGEST:
+            run_missing_sweep()
+        else:
+            run_update_alerts()
         log.info("Sleeping for %s seconds", SLEEP_TIME)
         time.sleep(SLEEP_TIME)
         log.info("Waking up. Starting next check...")
@@ -234,6 +429,7 @@ def main_event_loop():
 
 if __name__ == "__main__":
     log.info("Starting alert service")
+    ntfy.start_in_thread()
     try:
         main_event_loop()
     except Exception as e:
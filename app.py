@@ -1,12 +1,47 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import routes
+from alert_evaluator import alert_evaluator
+from ingest_buffer import ingest_buffer
+from jobs import job_queue
+from notifications import ntfy
+from pubsub import broker
+from settings import ALERTS_ON_INGEST, INGEST_BUFFERED, UDP_INGEST_PORT
+from udp_ingest import start_udp_ingest
 
 print("Starting FastAPI server...")
 
 origins = ["*"]
 
-app = FastAPI(debug=True)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ntfy.start()
+    if ALERTS_ON_INGEST:
+        await alert_evaluator.start()
+    await job_queue.start()
+    if INGEST_BUFFERED:
+        await ingest_buffer.start()
+    udp_transport = udp_protocol = None
+    if UDP_INGEST_PORT:
+        udp_transport, udp_protocol = await start_udp_ingest()
+    yield
+    # end the live event streams so the server can shut down
+    broker.close()
+    if udp_transport is not None:
+        await udp_protocol.drain()
+        udp_transport.close()
+    # flush whatever is still queued before the process exits
+    await ingest_buffer.stop()
+    await job_queue.stop()
+    await alert_evaluator.stop()
+    # last, so the notifications raised while shutting down go out too
+    await ntfy.stop()
+
+
+app = FastAPI(debug=True, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -3,6 +3,8 @@ import logging
 
 from sqlalchemy import (
     create_engine,
+    event,
+    DDL,
     Enum,
     Column,
     String,
@@ -10,13 +12,18 @@ from sqlalchemy import (
     Float,
     Boolean,
     DateTime,
+    BigInteger,
+    Index,
+    Integer,
+    UniqueConstraint,
 )
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.ext.declarative import declarative_base
 import shortuuid
-from datetime import datetime, timezone
 
-from settings import DATABASE_URL
+from settings import ASYNC_DATABASE_URL, DATABASE_URL
+from utils import utc_now
 
 log = logging.getLogger(__name__)
 
@@ -25,6 +32,20 @@ engine = create_engine(DATABASE_URL)
 log.info("Connected to database")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The API runs on the event loop and must not block it, so it uses its own
+# async engine (asyncpg / aiosqlite). The alert service and alembic stay sync.
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
+
+async def get_db():
+    """FastAPI dependency providing one AsyncSession per request."""
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
 Base = declarative_base()
 
 
@@ -47,19 +68,132 @@ class Sensors(Base):
     description = Column(String, nullable=True)
     status = Column(Enum(StatusChoices), nullable=False, default=StatusChoices.BLACK)
     active = Column(Boolean, nullable=False, default=True)
+    # latest reading, kept up to date by the ingest path (see ingest.py)
+    last_value = Column(Float, nullable=True)
+    last_battery = Column(Float, nullable=True)
+    last_seen_at = Column(DateTime, nullable=True)
+    last_reading_id = Column(BigInteger, nullable=True)
 
     data = relationship("SensorData", back_populates="sensor")
 
 
+# Substring search over name and id (see search.py). Postgres uses pg_trgm GIN
+# indexes from the migrations; SQLite gets an FTS5 trigram table mirroring the
+# two columns, kept in sync by triggers.
+SENSOR_SEARCH_DDL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS "SensorSearch" USING fts5(
+        name, id, content="Sensors", content_rowid="rowid", tokenize="trigram"
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS "SensorSearch_insert" AFTER INSERT ON "Sensors"
+    BEGIN
+        INSERT INTO "SensorSearch" (rowid, name, id)
+        VALUES (new.rowid, new.name, new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS "SensorSearch_delete" AFTER DELETE ON "Sensors"
+    BEGIN
+        INSERT INTO "SensorSearch" ("SensorSearch", rowid, name, id)
+        VALUES ('delete', old.rowid, old.name, old.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS "SensorSearch_update"
+    AFTER UPDATE OF name, id ON "Sensors"
+    BEGIN
+        INSERT INTO "SensorSearch" ("SensorSearch", rowid, name, id)
+        VALUES ('delete', old.rowid, old.name, old.id);
+        INSERT INTO "SensorSearch" (rowid, name, id)
+        VALUES (new.rowid, new.name, new.id);
+    END
+    """,
+    """INSERT INTO "SensorSearch" ("SensorSearch") VALUES ('rebuild')""",
+)
+for statement in SENSOR_SEARCH_DDL:
+    event.listen(
+        Sensors.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite")
+    )
+
+
 class SensorData(Base):
+    """A single reading.
+
+    On Postgres the table is range partitioned by month on created_at (see
+    partitions.py), its primary key is (id, created_at) and the (sensor_id,
+    seq) unique index exists per partition. The mapping below is what
+    create_all builds everywhere else.
+    """
+
     __tablename__ = "SensorData"
 
-    id = Column(String, primary_key=True, index=True, default=lambda: shortuuid.uuid())
+    # compact, insert-ordered key; SQLite only autoincrements INTEGER keys
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
     sensor_id = Column(String, ForeignKey("Sensors.id"), nullable=True)
     value = Column(Float, nullable=False)
-    created_at = Column(
-        DateTime, nullable=False, default=lambda: datetime.now(timezone.utc)
-    )
+    created_at = Column(DateTime, nullable=False, default=utc_now)
     battery_value = Column(Float, nullable=True)
+    # per-device sequence number, makes retried uploads idempotent
+    seq = Column(BigInteger, nullable=True)
 
     sensor = relationship("Sensors", back_populates="data")
+
+    __table_args__ = (
+        UniqueConstraint("sensor_id", "seq", name="uq_SensorData_sensor_id_seq"),
+        # every history, alert and latest-reading query filters on the sensor
+        # and sorts by time
+        Index("ix_SensorData_sensor_id_created_at", sensor_id, created_at.desc()),
+    )
+
+
+class AlertState(Base):
+    """Whether an alert of a sensor is raised, and when it was last notified.
+
+    Rows only change when an alert is raised or cleared. Raising it notifies
+    unless the sensor is still within ``cooldown_until`` of the previous
+    notification of the same alert.
+    """
+
+    __tablename__ = "AlertState"
+
+    sensor_id = Column(
+        String, ForeignKey("Sensors.id", ondelete="CASCADE"), primary_key=True
+    )
+    alert = Column(String, primary_key=True)
+    active = Column(Boolean, nullable=False, default=False)
+    changed_at = Column(DateTime, nullable=True)
+    notified_at = Column(DateTime, nullable=True)
+    cooldown_until = Column(DateTime, nullable=True)
+
+
+class RollupMixin:
+    """Aggregates of the readings of one sensor in one time bucket."""
+
+    sensor_id = Column(String, primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+    avg_value = Column(Float, nullable=False)
+    count = Column(Integer, nullable=False)
+    last_battery = Column(Float, nullable=True)
+
+
+class SensorDataHourly(RollupMixin, Base):
+    __tablename__ = "SensorDataHourly"
+
+
+class SensorDataDaily(RollupMixin, Base):
+    __tablename__ = "SensorDataDaily"
+
+
+class RollupWatermark(Base):
+    """How far into SensorData (by id) the rollup tables are up to date."""
+
+    __tablename__ = "RollupWatermark"
+
+    name = Column(String, primary_key=True)
+    last_id = Column(BigInteger, nullable=False, default=0)
+    # highest id seen by the previous run, rolled up by the next one
+    pending_id = Column(BigInteger, nullable=False, default=0)
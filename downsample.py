@@ -0,0 +1,45 @@
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """Indices of the points Largest-Triangle-Three-Buckets keeps.
+
+    ``x`` must be ascending. The first and last points are always kept and
+    every bucket in between contributes the point forming the largest
+    triangle with the previously kept point and the next bucket's average.
+    The per-bucket work is vectorized; only the walk over the
+    ``max_points - 2`` buckets is a Python loop.
+    """
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # max_points - 2 buckets over the points between the first and the last
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.intp)
+    counts = np.diff(edges)
+    average_x = np.add.reduceat(x[: n - 1], edges[:-1]) / counts
+    average_y = np.add.reduceat(y[: n - 1], edges[:-1]) / counts
+    # the last bucket looks ahead to the last point
+    next_x = np.append(average_x[1:], x[-1])
+    next_y = np.append(average_y[1:], y[-1])
+
+    selected = np.empty(max_points, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - next_x[i]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (next_y[i] - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def timestamps(values) -> np.ndarray:
+    """Datetimes as float seconds, the x axis for ``lttb``."""
+    return np.array(values, dtype="datetime64[us]").astype(np.int64) / 1e6
@@ -0,0 +1,303 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import shortuuid
+from sqlalchemy import bindparam, case, insert, or_, select, true, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from alert_evaluator import alert_evaluator
+from db_setup import Sensors, SensorData, StatusChoices
+from models import SensorDataRequest
+from pubsub import broker, reading_event
+from sensor_cache import sensor_id_cache
+from settings import MAX_ANALOG_VALUE, MAX_CLOCK_SKEW_SECONDS, MAX_READING_AGE_DAYS
+from utils import to_naive_utc
+from versions import data_versions
+
+# Dialects with INSERT ... ON CONFLICT DO NOTHING ... RETURNING support.
+UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def new_sensor_values(mac_address: str) -> dict:
+    """Column values for a sensor registered on first contact."""
+    id = shortuuid.uuid()
+    return dict(
+        id=id,
+        mac_address=mac_address,
+        name=f"Unnamed Sensor - {id}",
+        threshold_green=50,
+        threshold_yellow=33,
+        threshold_red=1,
+        description="A moisture sensor",
+    )
+
+
+def resolve_created_at(
+    log_entry: SensorDataRequest, received_at: datetime
+) -> SensorDataRequest:
+    """Returns the reading with an absolute, skew-corrected ``created_at``.
+
+    Relative readings are placed ``sent_monotonic - monotonic`` seconds before
+    ``received_at``. Absolute ones are shifted by the difference between
+    ``received_at`` and the device's ``sent_at`` when it is given. Readings
+    without any timestamp get ``received_at``. Raises ValueError when the
+    result is in the future or older than MAX_READING_AGE_DAYS.
+    """
+    if log_entry.monotonic is not None:
+        if log_entry.sent_monotonic is None:
+            raise ValueError("monotonic requires sent_monotonic")
+        age = log_entry.sent_monotonic - log_entry.monotonic
+        if age < 0:
+            raise ValueError("monotonic is later than sent_monotonic")
+        created_at = received_at - timedelta(seconds=age)
+    elif log_entry.created_at is not None:
+        created_at = to_naive_utc(log_entry.created_at)
+        if log_entry.sent_at is not None:
+            created_at += received_at - to_naive_utc(log_entry.sent_at)
+    else:
+        created_at = received_at
+
+    if created_at > received_at + timedelta(seconds=MAX_CLOCK_SKEW_SECONDS):
+        raise ValueError(f"created_at {created_at.isoformat()} is in the future")
+    if created_at < received_at - timedelta(days=MAX_READING_AGE_DAYS):
+        raise ValueError(f"created_at {created_at.isoformat()} is too old")
+
+    return log_entry.model_copy(
+        update=dict(
+            created_at=created_at, sent_at=None, monotonic=None, sent_monotonic=None
+        )
+    )
+
+
+ROW_KEY_COLUMNS = (
+    SensorData.sensor_id,
+    SensorData.seq,
+    SensorData.created_at,
+    SensorData.value,
+    SensorData.battery_value,
+)
+
+
+def row_key(row: dict) -> tuple:
+    return tuple(row[column.key] for column in ROW_KEY_COLUMNS)
+
+
+def sensor_data_values(log_entry: SensorDataRequest, sensor_id: str) -> dict:
+    """Column values for a SensorData row built from a resolved reading."""
+    return dict(
+        sensor_id=sensor_id,
+        value=MAX_ANALOG_VALUE - log_entry.value,
+        created_at=log_entry.created_at,
+        battery_value=log_entry.battery,
+        seq=log_entry.seq,
+    )
+
+
+async def select_sensor_ids(db: AsyncSession, mac_addresses) -> dict[str, str]:
+    result = await db.execute(
+        select(Sensors.mac_address, Sensors.id).where(
+            Sensors.mac_address.in_(mac_addresses)
+        )
+    )
+    return dict(result.all())
+
+
+async def register_sensors(db: AsyncSession, mac_addresses) -> dict[str, str]:
+    """Returns sensor ids for the MAC addresses, registering unknown sensors.
+
+    Registration is a single ``INSERT ... ON CONFLICT (mac_address) DO NOTHING
+    RETURNING`` so concurrent first readings from one device cannot collide on
+    the unique columns. Addresses that turn out to be registered already are
+    read back with one SELECT. They are inserted in sorted order, so two
+    concurrent batches take the ``mac_address`` index locks in the same order
+    and cannot deadlock.
+    """
+    mac_addresses = sorted(mac_addresses)
+    upsert_insert = UPSERT_INSERTS.get(db.bind.dialect.name)
+    if upsert_insert is None:
+        sensor_ids = await select_sensor_ids(db, mac_addresses)
+        missing = [
+            new_sensor_values(mac) for mac in mac_addresses if mac not in sensor_ids
+        ]
+        if missing:
+            await db.execute(insert(Sensors).values(missing))
+            sensor_ids.update({row["mac_address"]: row["id"] for row in missing})
+        return sensor_ids
+
+    result = await db.execute(
+        upsert_insert(Sensors)
+        .values([new_sensor_values(mac) for mac in mac_addresses])
+        .on_conflict_do_nothing(index_elements=[Sensors.mac_address])
+        .returning(Sensors.mac_address, Sensors.id)
+    )
+    sensor_ids = dict(result.all())
+    existing = [mac for mac in mac_addresses if mac not in sensor_ids]
+    if existing:
+        sensor_ids.update(await select_sensor_ids(db, existing))
+    return sensor_ids
+
+
+async def resolve_sensor_ids(db: AsyncSession, mac_addresses) -> dict[str, str]:
+    """Maps every MAC address to a sensor id, registering unknown sensors.
+
+    Cached sensors cost nothing and the rest go through ``register_sensors``.
+    Nothing is committed here; callers that roll back must discard the MAC
+    addresses from ``sensor_id_cache``.
+    """
+    sensor_ids = {}
+    uncached = set()
+    for mac in set(mac_addresses):
+        sensor_id = sensor_id_cache.get(mac)
+        if sensor_id is None:
+            uncached.add(mac)
+        else:
+            sensor_ids[mac] = sensor_id
+    if not uncached:
+        return sensor_ids
+
+    found = await register_sensors(db, uncached)
+    for mac, sensor_id in found.items():
+        sensor_id_cache.put(mac, sensor_id)
+    sensor_ids.update(found)
+    return sensor_ids
+
+
+async def insert_sensor_data(
+    db: AsyncSession, entries: list[SensorDataRequest]
+) -> list[dict]:
+    """Writes all readings with one multi-row INSERT and returns the rows.
+
+    Rows come back in the order of ``entries`` with their new id. Readings
+    whose (sensor, seq) is already stored are retries; the INSERT skips them
+    with ``ON CONFLICT DO NOTHING`` and their id is None. The readings must
+    have gone through ``resolve_created_at``. Nothing is committed here; the
+    caller owns the transaction.
+    """
+    if not entries:
+        return []
+
+    sensor_ids = await resolve_sensor_ids(db, (entry.mac_address for entry in entries))
+    rows = [
+        sensor_data_values(entry, sensor_ids[entry.mac_address]) for entry in entries
+    ]
+    upsert_insert = UPSERT_INSERTS.get(db.bind.dialect.name)
+    if upsert_insert is None:
+        # the unique constraint still rejects duplicates, failing the batch
+        statement = insert(SensorData)
+    else:
+        # no conflict target: on Postgres the (sensor_id, seq) unique index
+        # exists per partition only, see partitions.py
+        statement = upsert_insert(SensorData).on_conflict_do_nothing()
+    result = await db.execute(
+        statement.values(rows).returning(SensorData.id, *ROW_KEY_COLUMNS)
+    )
+
+    # RETURNING order is not guaranteed and skipped rows return nothing, so
+    # ids are matched back by content. Rows with equal content are
+    # interchangeable, and among rows sharing a seq only the first is stored.
+    returned_ids = defaultdict(list)
+    for id, *key in result.all():
+        returned_ids[tuple(key)].append(id)
+    for row in rows:
+        ids = returned_ids[row_key(row)]
+        row["id"] = ids.pop(0) if ids else None
+
+    await update_latest_readings(db, [row for row in rows if row["id"] is not None])
+    return rows
+
+
+def newest_per_sensor(rows: list[dict]) -> dict[str, dict]:
+    latest = {}
+    for row in rows:
+        current = latest.get(row["sensor_id"])
+        if current is None or row["created_at"] >= current["created_at"]:
+            latest[row["sensor_id"]] = row
+    return latest
+
+
+async def update_latest_readings(db: AsyncSession, rows: list[dict]):
+    """Moves the ``last_*`` columns of Sensors forward to the newest rows.
+
+    Runs in the ingest transaction, one UPDATE per sensor. The update only
+    applies when the reading is at least as new as the stored one, so a late
+    upload of buffered readings never hides a newer reading. Sensors are
+    updated in ``sensor_id`` order, so concurrent batches lock their rows in
+    the same order and cannot deadlock. A sensor the alert service marked
+    missing (inactive and BLACK) is active again once it reports.
+    """
+    latest = newest_per_sensor(rows)
+    if not latest:
+        return
+
+    sensors = Sensors.__table__
+    await db.execute(
+        update(sensors)
+        .where(
+            sensors.c.id == bindparam("b_sensor_id"),
+            or_(
+                sensors.c.last_seen_at.is_(None),
+                sensors.c.last_seen_at <= bindparam("b_created_at"),
+            ),
+        )
+        .values(
+            last_value=bindparam("b_value"),
+            last_battery=bindparam("b_battery"),
+            last_seen_at=bindparam("b_created_at"),
+            last_reading_id=bindparam("b_id"),
+            active=case(
+                (sensors.c.status == StatusChoices.BLACK, true()),
+                else_=sensors.c.active,
+            ),
+        ),
+        [
+            dict(
+                b_sensor_id=row["sensor_id"],
+                b_value=row["value"],
+                b_battery=row["battery_value"],
+                b_created_at=row["created_at"],
+                b_id=row["id"],
+            )
+            for _, row in sorted(latest.items())
+        ],
+    )
+
+
+def plausible_readings(entries, received_at: datetime) -> list[SensorDataRequest]:
+    """Resolves every reading's created_at, dropping implausible ones."""
+    resolved = []
+    for log_entry in entries:
+        try:
+            resolved.append(resolve_created_at(log_entry, received_at))
+        except ValueError:
+            continue
+    return resolved
+
+
+async def write_readings(
+    db: AsyncSession, entries: list[SensorDataRequest]
+) -> list[int | None]:
+    """Inserts resolved readings in one transaction and commits it.
+
+    This is the write path shared by every ingest route, the write-behind
+    buffer and the UDP listener. On failure the transaction is rolled back,
+    the MAC addresses are dropped from the cache and the error is re-raised.
+    Returns the new ids, None for duplicates.
+    """
+    try:
+        rows = await insert_sensor_data(db, entries)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        sensor_id_cache.discard(*(log_entry.mac_address for log_entry in entries))
+        raise
+
+    written = [row for row in rows if row["id"] is not None]
+    if written:
+        data_versions.bump(*{row["sensor_id"] for row in written})
+    if broker.subscribers:
+        # one event per sensor, so a backfill cannot overflow the queues
+        for row in newest_per_sensor(written).values():
+            broker.publish("reading", reading_event(row))
+    alert_evaluator.observe(written)
+    return [row["id"] for row in rows]
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+from db_setup import AsyncSessionLocal
+from ingest import write_readings
+from models import SensorDataRequest
+from settings import (
+    INGEST_ENQUEUE_TIMEOUT,
+    INGEST_FLUSH_INTERVAL_MS,
+    INGEST_FLUSH_ROWS,
+    INGEST_QUEUE_SIZE,
+)
+
+log = logging.getLogger(__name__)
+
+
+class IngestBufferFull(Exception):
+    pass
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether a failed write may succeed later, like while the database is down."""
+    if isinstance(error, DBAPIError) and error.connection_invalidated:
+        return True
+    return isinstance(error, (OperationalError, InterfaceError, OSError, TimeoutError))
+
+
+class IngestBuffer:
+    """Write-behind queue between POST /log and the SensorData table.
+
+    Readings are queued by the request handler and written by a background
+    task with one multi-row INSERT per flush. A flush happens every
+    ``flush_interval`` seconds or as soon as ``flush_rows`` readings are
+    waiting, whichever comes first. A batch that fails with a transient error
+    is retried on the next flush, so while the database is down the queue
+    fills up and ``submit`` starts refusing readings instead of growing
+    without bound. A batch the database rejects is split until the readings
+    at fault are found and dropped, so they cannot block the queue.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = INGEST_FLUSH_INTERVAL_MS / 1000,
+        flush_rows: int = INGEST_FLUSH_ROWS,
+        max_size: int = INGEST_QUEUE_SIZE,
+        enqueue_timeout: float = INGEST_ENQUEUE_TIMEOUT,
+    ):
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.max_size = max_size
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: asyncio.Queue | None = None
+        self._ready: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._retry: list[SensorDataRequest] = []
+        self._closing = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._ready = asyncio.Event()
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+        log.info(
+            "Ingest buffer started (every %ss or %s rows)",
+            self.flush_interval,
+            self.flush_rows,
+        )
+
+    async def stop(self):
+        """Stops accepting readings and waits until everything is flushed."""
+        if not self.running:
+            return
+        self._closing = True
+        self._ready.set()
+        await self._task
+        self._task = None
+        log.info("Ingest buffer stopped")
+
+    async def submit(self, log_entry: SensorDataRequest):
+        """Queues a reading, waiting up to ``enqueue_timeout`` for room."""
+        if not self.running or self._closing:
+            raise IngestBufferFull("Ingest buffer is not running")
+        try:
+            await asyncio.wait_for(self._queue.put(log_entry), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            raise IngestBufferFull("Ingest buffer is full")
+        if self._queue.qsize() >= self.flush_rows:
+            self._ready.set()
+
+    def _take(self) -> list[SensorDataRequest]:
+        batch, self._retry = self._retry, []
+        while len(batch) < self.flush_rows and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while not (self._closing and self._queue.empty() and not self._retry):
+            if self._queue.qsize() < self.flush_rows and not self._closing:
+                try:
+                    await asyncio.wait_for(self._ready.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._ready.clear()
+
+            batch = self._take()
+            if not batch:
+                continue
+            retry = await self._flush(batch)
+            if not retry:
+                continue
+            if self._closing:
+                log.error("Dropping %s readings on shutdown", len(retry))
+            else:
+                self._retry = retry
+                await asyncio.sleep(self.flush_interval)
+
+    async def _flush(self, batch: list[SensorDataRequest]) -> list[SensorDataRequest]:
+        """Writes a batch, returns the readings to retry.
+
+        Never raises, the flush task has to outlive any error.
+        """
+        parts = [batch]
+        while parts:
+            part = parts.pop()
+            try:
+                await self._write(part)
+            except Exception as e:
+                if is_transient(e):
+                    retry = [
+                        entry
+                        for unwritten in (part, *reversed(parts))
+                        for entry in unwritten
+                    ]
+                    log.exception("Flush of %s readings failed", len(retry))
+                    return retry
+                if len(part) == 1:
+                    log.exception("Dropping rejected reading %r", part[0])
+                    continue
+                # halves in order, the first one is written first
+                middle = len(part) // 2
+                parts += [part[middle:], part[:middle]]
+        return []
+
+    @staticmethod
+    async def _write(batch: list[SensorDataRequest]):
+        async with AsyncSessionLocal() as db:
+            await write_readings(db, batch)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "max_size": self.max_size,
+        }
+
+
+ingest_buffer = IngestBuffer()
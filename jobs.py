@@ -0,0 +1,81 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, Hashable
+
+log = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """Background jobs of the API process, run one at a time by a worker task.
+
+    Request handlers enqueue work that must not hold up their response. Jobs
+    are keyed: enqueueing a key that is still waiting replaces its job instead
+    of adding another run, so a burst of updates to one sensor costs a single
+    evaluation.
+    """
+
+    def __init__(self):
+        self._jobs: dict[Hashable, Callable[[], Awaitable]] = {}
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self.done = 0
+        self.failed = 0
+        self.coalesced = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        self._jobs = {}
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        log.info("Job queue started")
+
+    async def stop(self):
+        """Runs the jobs still waiting, then stops."""
+        if not self.running:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+        log.info("Job queue stopped")
+
+    def enqueue(self, key: Hashable, job: Callable[[], Awaitable]) -> bool:
+        """Schedules ``job()``; returns False when it joined a waiting job."""
+        if not self.running:
+            log.warning("Job queue is not running, dropping job %s", key)
+            return False
+        coalesced = key in self._jobs
+        self._jobs[key] = job
+        if coalesced:
+            self.coalesced += 1
+            return False
+        self._queue.put_nowait(key)
+        return True
+
+    async def _run(self):
+        while True:
+            key = await self._queue.get()
+            if key is None:
+                return
+            job = self._jobs.pop(key)
+            try:
+                await job()
+            except Exception:
+                self.failed += 1
+                log.exception("Job %s failed", key)
+            else:
+                self.done += 1
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "waiting": len(self._jobs),
+            "done": self.done,
+            "failed": self.failed,
+            "coalesced": self.coalesced,
+        }
+
+
+job_queue = JobQueue()
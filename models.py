@@ -1,15 +1,27 @@
+from datetime import datetime
 from typing import Optional
 
 from fastapi import Query
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 # Pydantic models
 class SensorDataRequest(BaseModel):
     mac_address: str
     value: float
-    created_at: str | None = None
+    # Device timestamps, either absolute (created_at, optionally with the
+    # device's sent_at to correct its clock skew) or on the device's own clock
+    # in seconds (monotonic, with sent_monotonic taken right before sending).
+    # Without them the reading is stamped with the time it was received.
+    created_at: datetime | None = None
+    sent_at: datetime | None = None
+    monotonic: float | None = None
+    sent_monotonic: float | None = None
     battery: float | None = None
+    # Sequence number from the device's persistent counter. A reading whose
+    # (sensor, seq) is already stored is a retry and is ignored. The column is
+    # a BIGINT.
+    seq: int | None = Field(None, ge=0, le=2**63 - 1)
 
 class SensorRequest(BaseModel):
     name: str = None
@@ -20,10 +32,12 @@ class SensorRequest(BaseModel):
     active: Optional[bool] = None
 
 class SensorDataFilters(BaseModel):
-    start_date: Optional[str] = None
-    end_date: Optional[str] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
     page: int = Query(1, ge=1)
     page_size: int = Query(10, ge=1, le=100)
+    # opaque keyset cursor from a previous response, takes precedence over page
+    cursor: Optional[str] = None
     active: Optional[bool] = None
     sort_by: Optional[str] = None
     order: Optional[str] = None
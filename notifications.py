@@ -0,0 +1,299 @@
+"""Asynchronous ntfy notifications.
+
+``notify`` only queues a notification, so neither the alert checks nor the
+API ever wait for ntfy. A background task sends the queue over one pooled
+``httpx.AsyncClient``:
+
+- notifications with the same title raised within NTFY_COALESCE_SECONDS of
+  each other go out as one message listing all their items;
+- a topic gets at most one request per NTFY_MIN_INTERVAL_SECONDS;
+- timeouts, connection errors, 429 and 5xx answers are retried with
+  exponential backoff or after their Retry-After, both capped at
+  MAX_BACKOFF_SECONDS; any other answer is final. A retry waits in a queue
+  of its own, so other notifications go out meanwhile;
+- while the queue (NTFY_QUEUE_SIZE) is full, new notifications are dropped.
+
+The API starts the dispatcher in its lifespan. The synchronous alert service
+runs it on an event loop of its own with ``start_in_thread``.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+from dataclasses import dataclass, field
+
+import httpx
+
+from settings import (
+    NTFY_BACKOFF_SECONDS,
+    NTFY_COALESCE_SECONDS,
+    NTFY_MIN_INTERVAL_SECONDS,
+    NTFY_QUEUE_SIZE,
+    NTFY_RETRIES,
+    NTFY_TIMEOUT_SECONDS,
+    NTFY_TOPIC,
+    NTFY_URL,
+)
+
+log = logging.getLogger(__name__)
+
+MAX_BACKOFF_SECONDS = 300
+
+
+@dataclass
+class Notification:
+    title: str
+    heading: str
+    items: list[str] = field(default_factory=list)
+    priority: int = 1  # 1-5 with 5 being the highest
+    tags: str = "alien"
+    topic: str = NTFY_TOPIC
+
+    @property
+    def key(self) -> tuple:
+        """Notifications with equal keys are coalesced."""
+        return (self.topic, self.title, self.heading, self.priority, self.tags)
+
+    def merge(self, other: "Notification"):
+        self.items.extend(item for item in other.items if item not in self.items)
+
+    @property
+    def message(self) -> str:
+        return f"{self.heading}\n {'\n'.join(self.items)}"
+
+
+def retry_after(response: httpx.Response) -> float | None:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+class NtfyDispatcher:
+    def __init__(
+        self,
+        url: str = NTFY_URL,
+        max_size: int = NTFY_QUEUE_SIZE,
+        coalesce_seconds: float = NTFY_COALESCE_SECONDS,
+        min_interval: float = NTFY_MIN_INTERVAL_SECONDS,
+        retries: int = NTFY_RETRIES,
+        backoff: float = NTFY_BACKOFF_SECONDS,
+        timeout: float = NTFY_TIMEOUT_SECONDS,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.url = url
+        self.max_size = max_size
+        self.coalesce_seconds = coalesce_seconds
+        self.min_interval = min_interval
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._last_request: dict[str, float] = {}
+        # (due, order, notification, attempt) of the failed sends
+        self._retries: list[tuple[float, int, Notification, int]] = []
+        self._order = itertools.count()
+        self._closing = asyncio.Event()
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._client = httpx.AsyncClient(
+            base_url=self.url,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=2, max_keepalive_connections=2),
+            transport=self.transport,
+        )
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._last_request = {}
+        self._retries = []
+        self._closing = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        log.info("Notifications to %s started", self.url)
+
+    def start_in_thread(self):
+        """Runs the dispatcher on its own event loop, for synchronous callers."""
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name="ntfy", daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self.start(), loop).result()
+
+    async def stop(self):
+        """Sends what is still queued, without retries, and closes the client."""
+        if not self.running:
+            return
+        self._closing.set()
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        await self._client.aclose()
+        log.info("Notifications stopped")
+
+    def submit(self, notification: Notification):
+        """Queues a notification; safe to call from any thread."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            log.warning("Notifications are not running, dropping %r", notification)
+            self.dropped += 1
+            return
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        if current is loop:
+            self._put(notification)
+        else:
+            loop.call_soon_threadsafe(self._put, notification)
+
+    def _put(self, notification: Notification):
+        if not self.running or self._closing.is_set():
+            log.warning("Notifications are not running, dropping %r", notification)
+            self.dropped += 1
+            return
+        try:
+            self._queue.put_nowait(notification)
+        except asyncio.QueueFull:
+            log.warning("Notification queue is full, dropping %r", notification)
+            self.dropped += 1
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            pending = {}
+            try:
+                first = await asyncio.wait_for(self._queue.get(), self._retry_wait())
+            except asyncio.TimeoutError:
+                first = None
+            else:
+                stopping = first is None
+            if first is not None:
+                pending[first.key] = first
+                deadline = loop.time() + self.coalesce_seconds
+            while pending and not self._closing.is_set():
+                try:
+                    notification = await asyncio.wait_for(
+                        self._queue.get(), deadline - loop.time()
+                    )
+                except asyncio.TimeoutError:
+                    break
+                if notification is None:
+                    stopping = True
+                    break
+                if notification.key in pending:
+                    pending[notification.key].merge(notification)
+                    self.coalesced += 1
+                else:
+                    pending[notification.key] = notification
+            for notification in pending.values():
+                await self._send(notification)
+            # on stop every waiting retry gets its last attempt now
+            while self._retries and (stopping or self._retries[0][0] <= loop.time()):
+                _, _, notification, attempt = heapq.heappop(self._retries)
+                await self._send(notification, attempt)
+
+    def _retry_wait(self) -> float | None:
+        """Seconds until the next retry is due, None without retries."""
+        if not self._retries:
+            return None
+        return max(self._retries[0][0] - asyncio.get_running_loop().time(), 0)
+
+    async def _rate_limit(self, topic: str):
+        loop = asyncio.get_running_loop()
+        last = self._last_request.get(topic)
+        if last is not None:
+            wait = last + self.min_interval - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        self._last_request[topic] = loop.time()
+
+    async def _send(self, notification: Notification, attempt: int = 0):
+        """Makes one attempt; a retry is scheduled instead of waited for."""
+        await self._rate_limit(notification.topic)
+        delay = None
+        try:
+            response = await self._client.post(
+                notification.topic,
+                headers={
+                    "Title": notification.title,
+                    "Priority": str(notification.priority),
+                    "Tags": notification.tags,
+                },
+                content=notification.message.encode(),
+            )
+        except httpx.HTTPError as e:
+            error = repr(e)
+        else:
+            if response.is_success:
+                self.sent += 1
+                return
+            error = f"{response.status_code} {response.text[:200]}"
+            if response.status_code != 429 and response.status_code < 500:
+                self._drop(notification, error)
+                return
+            delay = retry_after(response)
+
+        if attempt >= self.retries or self._closing.is_set():
+            self._drop(notification, error)
+            return
+        if delay is None:
+            delay = self.backoff * 2**attempt
+        delay = min(delay, MAX_BACKOFF_SECONDS)
+        log.warning(
+            "Sending %r failed (%s), retry %s in %.1fs",
+            notification.title,
+            error,
+            attempt + 1,
+            delay,
+        )
+        due = asyncio.get_running_loop().time() + delay
+        heapq.heappush(
+            self._retries, (due, next(self._order), notification, attempt + 1)
+        )
+
+    def _drop(self, notification: Notification, error: str):
+        self.failed += 1
+        log.error("Dropping notification %r: %s", notification.title, error)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "max_size": self.max_size,
+            "retrying": len(self._retries),
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
+
+
+ntfy = NtfyDispatcher()
+
+
+def notify(
+    title: str, heading: str, items: list[str], priority: int = 1, tags: str = "alien"
+):
+    """Queues a notification listing ``items``; nothing is sent without items."""
+    if items:
+        ntfy.submit(
+            Notification(
+                title=title,
+                heading=heading,
+                items=list(items),
+                priority=priority,
+                tags=tags,
+            )
+        )
@@ -0,0 +1,47 @@
+"""Opaque keyset pagination cursors.
+
+A cursor holds the sort value and id of the row a page starts after, plus
+whether it points to the next or the previous page. Clients must treat it as
+an opaque string.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import Column, tuple_
+from sqlalchemy.sql import ColumnElement
+
+NEXT = "next"
+PREV = "prev"
+
+
+def encode_cursor(value, id: str, direction: str) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    data = json.dumps([value, id, direction], separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, column: Column) -> tuple:
+    """Returns (value, id, direction), raising ValueError for a bad cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, id, direction = json.loads(base64.urlsafe_b64decode(padded))
+        if column.type.python_type is datetime:
+            value = datetime.fromisoformat(value)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if direction not in (NEXT, PREV):
+        raise ValueError("Invalid cursor")
+    return value, id, direction
+
+
+def after(
+    column: Column, id_column: Column, value, id: str, descending: bool
+) -> ColumnElement:
+    """Rows after (value, id) in (column, id) order."""
+    key = tuple_(column, id_column)
+    if descending:
+        return key < tuple_(value, id)
+    return key > tuple_(value, id)
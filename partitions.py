@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+"""Monthly range partitions of SensorData on Postgres.
+
+Every month of readings lives in its own ``SensorData_yYYYYmMM`` partition.
+``maintain_partitions`` creates the partitions ingest may need soon and drops
+the ones older than SENSOR_DATA_RETENTION_MONTHS, which is a catalog change
+instead of a DELETE over millions of rows. It is idempotent and runs from the
+alert service loop, or by hand with ``python -m partitions``.
+
+Readings of a month without a partition land in the DEFAULT partition, so
+ingest keeps working while the maintenance is not running. Creating the
+month's partition later moves them out of it.
+
+Postgres cannot enforce a unique index across partitions that does not
+include the partition key, so every partition gets its own unique
+(sensor_id, seq) index for the ingest deduplication.
+"""
+
+import logging
+import re
+from datetime import date, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from db_setup import SessionLocal, SensorData
+from settings import (
+    MAX_READING_AGE_DAYS,
+    PARTITION_MONTHS_AHEAD,
+    SENSOR_DATA_RETENTION_MONTHS,
+)
+from utils import utc_now
+
+log = logging.getLogger(__name__)
+
+TABLE = SensorData.__tablename__
+PARTITION_NAME = re.compile(rf"^{TABLE}_y(\d{{4}})m(\d{{2}})$")
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def table_exists(db: Session, name: str) -> bool:
+    return (
+        db.scalar(text("SELECT to_regclass(:name)"), {"name": f'"{name}"'}) is not None
+    )
+
+
+def create_partition(db: Session, month: date):
+    """Creates the partition holding ``month`` unless it exists.
+
+    The table is created detached and filled with the month's rows from the
+    DEFAULT partition before it is attached, as Postgres refuses to attach a
+    range that the DEFAULT partition holds rows of.
+    """
+    name = partition_name(month)
+    if table_exists(db, name):
+        return
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    db.execute(text(f'CREATE TABLE "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS)'))
+    if table_exists(db, DEFAULT_PARTITION):
+        # no new rows of the month may arrive until the partition is attached
+        db.execute(text(f'LOCK TABLE "{DEFAULT_PARTITION}" IN EXCLUSIVE MODE'))
+        db.execute(
+            text(
+                f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" '
+                f"WHERE created_at >= '{start}' AND created_at < '{end}' "
+                f'RETURNING *) INSERT INTO "{name}" SELECT * FROM moved'
+            )
+        )
+    db.execute(
+        text(
+            f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" '
+            f"FOR VALUES FROM ('{start}') TO ('{end}')"
+        )
+    )
+    db.execute(
+        text(
+            f'CREATE UNIQUE INDEX IF NOT EXISTS "uq_{name}_sensor_id_seq" '
+            f'ON "{name}" (sensor_id, seq)'
+        )
+    )
+
+
+def existing_partitions(db: Session) -> dict[date, str]:
+    result = db.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:table AS regclass)"
+        ),
+        {"table": f'"{TABLE}"'},
+    )
+    partitions = {}
+    for (name,) in result:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+def ensure_partitions(db: Session, months_ahead: int = PARTITION_MONTHS_AHEAD):
+    """Creates partitions from the oldest month ingest accepts to a few ahead."""
+    now = utc_now()
+    month = (now - timedelta(days=MAX_READING_AGE_DAYS)).date().replace(day=1)
+    last = add_months(now.date().replace(day=1), months_ahead)
+    while month <= last:
+        create_partition(db, month)
+        month = add_months(month, 1)
+
+
+def drop_expired_partitions(
+    db: Session, retention_months: int = SENSOR_DATA_RETENTION_MONTHS
+) -> list[str]:
+    """Detaches and drops partitions that ended before the retention window."""
+    if retention_months <= 0:
+        return []
+    cutoff = add_months(utc_now().date().replace(day=1), -retention_months)
+    dropped = []
+    for month, name in sorted(existing_partitions(db).items()):
+        if add_months(month, 1) > cutoff:
+            continue
+        db.execute(text(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"'))
+        db.execute(text(f'DROP TABLE "{name}"'))
+        dropped.append(name)
+    return dropped
+
+
+def maintain_partitions():
+    """Creates upcoming and drops expired partitions; a no-op off Postgres."""
+    db = SessionLocal()
+    try:
+        if db.bind.dialect.name != "postgresql":
+            return
+        ensure_partitions(db)
+        dropped = drop_expired_partitions(db)
+        db.commit()
+        if dropped:
+            log.info("Dropped expired partitions: %s", dropped)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    maintain_partitions()
+    log.info("Partitions of %s are up to date", TABLE)
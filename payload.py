@@ -0,0 +1,64 @@
+"""Compact binary upload format shared with ``sensor_code/payload.py``.
+
+Version 1, little endian::
+
+    header   B version, B flags, 6s MAC address, I sequence number of the first
+             reading, I device clock when sent, H number of readings
+    reading  I device clock when measured, H raw soil value, H raw battery value
+             (0xFFFF when the battery was not measured)
+
+Device clock values are seconds on the sensor's own clock; they become
+``monotonic``/``sent_monotonic`` on the decoded readings. Readings are numbered
+consecutively from the header's sequence number.
+"""
+
+import struct
+from typing import NamedTuple
+
+from models import SensorDataRequest
+
+VERSION = 1
+HEADER = struct.Struct("<BB6sIIH")
+READING = struct.Struct("<IHH")
+NO_BATTERY = 0xFFFF
+
+
+class PayloadHeader(NamedTuple):
+    version: int
+    flags: int
+    mac_address: str
+    seq: int
+    sent_at: int
+    count: int
+
+
+def format_mac_address(mac: bytes) -> str:
+    """Formats raw MAC bytes the way the firmware reports them in JSON."""
+    return ":".join(f"{b:02X}" for b in mac)
+
+
+def decode_payload(data: bytes) -> tuple[PayloadHeader, list[SensorDataRequest]]:
+    """Decodes a binary upload, raising ValueError when it is malformed."""
+    if len(data) < HEADER.size:
+        raise ValueError("Payload shorter than its header")
+    version, flags, mac, seq, sent_at, count = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ValueError(f"Unsupported payload version {version}")
+    if len(data) != HEADER.size + count * READING.size:
+        raise ValueError(f"Payload length does not match {count} readings")
+
+    header = PayloadHeader(version, flags, format_mac_address(mac), seq, sent_at, count)
+    entries = [
+        SensorDataRequest(
+            mac_address=header.mac_address,
+            value=value,
+            battery=None if battery == NO_BATTERY else battery,
+            monotonic=clock,
+            sent_monotonic=sent_at,
+            seq=seq + index,
+        )
+        for index, (clock, value, battery) in enumerate(
+            READING.iter_unpack(data[HEADER.size :])
+        )
+    ]
+    return header, entries
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+
+from settings import EVENT_QUEUE_SIZE
+from utils import get_value_percentage
+
+log = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, max_size: int):
+        self.queue: asyncio.Queue[tuple[str, dict] | None] = asyncio.Queue(max_size)
+
+    def close(self):
+        """Ends the subscription; the consumer receives None next."""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class Broker:
+    """In-process fan-out of live events to the connected dashboards.
+
+    Every subscriber gets its own bounded queue, so ``publish`` never blocks
+    the ingest path. A subscriber whose queue is full is too slow to keep up
+    and is dropped; its client reconnects and reloads instead of silently
+    missing events.
+    """
+
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers: set[Subscription] = set()
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.queue_size)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+
+    def publish(self, event: str, data: dict):
+        self.published += 1
+        for subscription in list(self.subscribers):
+            try:
+                subscription.queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                log.warning("Dropping slow event subscriber")
+                self.dropped += 1
+                self.unsubscribe(subscription)
+                subscription.close()
+
+    def close(self):
+        """Ends every subscription, on shutdown."""
+        for subscription in list(self.subscribers):
+            self.unsubscribe(subscription)
+            subscription.close()
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "queue_size": self.queue_size,
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+def reading_event(row: dict) -> dict:
+    """Event data of a SensorData row written by the ingest path."""
+    return {
+        "id": row["id"],
+        "sensor_id": row["sensor_id"],
+        "raw_value": row["value"],
+        "value": get_value_percentage(row["value"]),
+        "created_at": row["created_at"].isoformat(),
+        "battery_value": row["battery_value"],
+    }
+
+
+def status_event(sensor_id: str, name: str, status, active: bool) -> dict:
+    return {
+        "sensor_id": sensor_id,
+        "name": name,
+        "status": status,
+        "active": active,
+    }
+
+
+broker = Broker()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+"""Hourly and daily rollups of SensorData for long chart ranges.
+
+``update_rollups`` is incremental: it looks at the readings inserted since
+the last run (tracked by id in RollupWatermark) and recomputes the buckets
+they fall into from SensorData, so running it twice over the same rows is
+harmless. Readings are picked up one run after their id was first seen,
+which leaves concurrent ingest transactions time to commit lower ids. It
+runs from the alert service loop, or by hand with ``python -m rollups``.
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import String, delete, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from db_setup import (
+    RollupWatermark,
+    SensorData,
+    SensorDataDaily,
+    SensorDataHourly,
+    SessionLocal,
+)
+from utils import utc_now
+
+log = logging.getLogger(__name__)
+
+WATERMARK = "SensorData"
+
+# coarsest first
+RESOLUTIONS = {
+    "day": (SensorDataDaily, timedelta(days=1)),
+    "hour": (SensorDataHourly, timedelta(hours=1)),
+}
+
+
+def bucket_start(created_at: datetime, step: timedelta) -> datetime:
+    if step >= timedelta(days=1):
+        return created_at.replace(hour=0, minute=0, second=0, microsecond=0)
+    return created_at.replace(minute=0, second=0, microsecond=0)
+
+
+def bucket_expression(dialect_name: str, step: timedelta):
+    """SQL for ``bucket_start`` of SensorData.created_at."""
+    unit = "day" if step >= timedelta(days=1) else "hour"
+    if dialect_name == "postgresql":
+        return func.date_trunc(unit, SensorData.created_at)
+    # SQLite stores DateTime as text; keep its format so buckets compare
+    hour = "00" if unit == "day" else "%H"
+    return func.strftime(f"%Y-%m-%d {hour}:00:00.000000", SensorData.created_at)
+
+
+def rollup_sensor(db: Session, sensor_id: str, start: datetime, end: datetime):
+    """Recomputes every bucket of a sensor between two reading times.
+
+    The buckets are aggregated by the database with one INSERT ... SELECT
+    per resolution, so no reading is loaded into Python.
+    """
+    start = bucket_start(start, timedelta(days=1))
+    end = bucket_start(end, timedelta(days=1)) + timedelta(days=1)
+
+    for model, step in RESOLUTIONS.values():
+        db.execute(
+            delete(model).where(
+                model.sensor_id == sensor_id,
+                model.bucket >= start,
+                model.bucket < end,
+            )
+        )
+        bucket = bucket_expression(db.bind.dialect.name, step)
+        readings = (
+            select(
+                bucket.label("bucket"),
+                SensorData.value,
+                # the newest battery value of the bucket, nulls last
+                func.first_value(SensorData.battery_value)
+                .over(
+                    partition_by=bucket,
+                    order_by=(
+                        SensorData.battery_value.is_(None),
+                        SensorData.created_at.desc(),
+                    ),
+                )
+                .label("last_battery"),
+            )
+            .where(
+                SensorData.sensor_id == sensor_id,
+                SensorData.created_at >= start,
+                SensorData.created_at < end,
+            )
+            .subquery()
+        )
+        db.execute(
+            insert(model).from_select(
+                [
+                    model.sensor_id,
+                    model.bucket,
+                    model.min_value,
+                    model.max_value,
+                    model.avg_value,
+                    model.count,
+                    model.last_battery,
+                ],
+                select(
+                    literal(sensor_id, String),
+                    readings.c.bucket,
+                    func.min(readings.c.value),
+                    func.max(readings.c.value),
+                    func.avg(readings.c.value),
+                    func.count(),
+                    func.max(readings.c.last_battery),
+                ).group_by(readings.c.bucket),
+            )
+        )
+
+
+def update_rollups(db: Session) -> int:
+    """Rolls up the readings inserted since the last run; returns the sensors."""
+    watermark = db.get(RollupWatermark, WATERMARK)
+    if watermark is None:
+        watermark = RollupWatermark(name=WATERMARK, last_id=0, pending_id=0)
+        db.add(watermark)
+
+    ranges = []
+    if watermark.pending_id > watermark.last_id:
+        ranges = db.execute(
+            select(
+                SensorData.sensor_id,
+                func.min(SensorData.created_at),
+                func.max(SensorData.created_at),
+            )
+            .where(
+                SensorData.id > watermark.last_id,
+                SensorData.id <= watermark.pending_id,
+                SensorData.sensor_id.is_not(None),
+            )
+            .group_by(SensorData.sensor_id)
+        ).all()
+    for sensor_id, start, end in ranges:
+        rollup_sensor(db, sensor_id, start, end)
+
+    watermark.last_id = watermark.pending_id
+    watermark.pending_id = max(
+        watermark.last_id,
+        db.scalar(select(func.coalesce(func.max(SensorData.id), 0))),
+    )
+    db.commit()
+    return len(ranges)
+
+
+def run_update_rollups():
+    db = SessionLocal()
+    try:
+        sensors = update_rollups(db)
+        log.info("Updated rollups of %s sensors", sensors)
+    finally:
+        db.close()
+
+
+def pick_resolution(
+    start: datetime | None, end: datetime | None, points: int | None
+) -> str | None:
+    """Coarsest rollup giving at least ``points`` buckets, None for raw rows."""
+    if points is None or start is None:
+        return None
+    span = (end or utc_now()) - start
+    for name, (_, step) in RESOLUTIONS.items():
+        if span / step >= points:
+            return name
+    return None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_update_rollups()
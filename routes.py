@@ -1,74 +1,78 @@
 from datetime import datetime
 
-from typing import Optional
+from typing import Any, Literal, Optional
 
-import shortuuid
-from fastapi import APIRouter, Depends, Query
+import numpy as np
+from fastapi import APIRouter, Body, Depends, Query, Request, Response
+from pydantic import ValidationError
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import aliased, Session, joinedload
-from sqlalchemy import func, asc, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlalchemy import func, desc, select
 from fastapi import HTTPException, status
 
-import alert_service
+from alert_evaluator import alert_evaluator, reevaluate_sensor
 from db_setup import Sensors, SensorData
 from models import SensorRequest, SensorDataRequest, SensorDataFilters
-from db_setup import SessionLocal
-
-
-from settings import MAX_ANALOG_VALUE
-from utils import get_value_percentage
+from downsample import lttb, timestamps
+from pubsub import broker, status_event
+from pagination import NEXT, PREV, after, decode_cursor, encode_cursor
+from payload import decode_payload
+from rollups import RESOLUTIONS, bucket_start, pick_resolution
+from search import sensor_search
+from db_setup import get_db
+from ingest_buffer import IngestBufferFull, ingest_buffer
+from ingest import plausible_readings, resolve_created_at, write_readings
+from jobs import job_queue
+from notifications import ntfy
+from sensor_cache import sensor_id_cache
+from streaming import (
+    raw_points,
+    record_points,
+    sensor_header,
+    stream_events,
+    stream_history,
+)
+from versions import data_versions, etag_matches, not_modified
+
+
+from settings import INGEST_BUFFERED, MAX_BATCH_SIZE
+from utils import get_value_percentage, to_naive_utc, utc_now
 
 router = APIRouter()
 
 
-def create_sensor(mac_address: str, db_session=None):
-    if not db_session:
-        db_session = SessionLocal()
-    id = shortuuid.uuid()
-    sensor = Sensors(
-        id=id,
-        mac_address=mac_address,
-        name=f"Unnamed Sensor - {id}",
-        threshold_green=50,
-        threshold_yellow=33,
-        threshold_red=1,
-        description="A moisture sensor",
-    )
-    db_session.add(sensor)
-    db_session.commit()
-    db_session.refresh(sensor)
-    return sensor
-
-
 @router.post("/log")
-async def log_request(log_entry: SensorDataRequest):
+async def log_request(log_entry: SensorDataRequest, db: AsyncSession = Depends(get_db)):
     """Logs incoming POST request to the database."""
-    max_value = MAX_ANALOG_VALUE
     try:
-        # Create a DB session
-        db = SessionLocal()
-        # get sensor id from mac address
-        sensor = (
-            db.query(Sensors)
-            .filter(Sensors.mac_address == log_entry.mac_address)
-            .first()
-        )
-        if not sensor:
-            sensor = create_sensor(log_entry.mac_address, db)
-        sensor_data = SensorData(
-            sensor_id=sensor.id,
-            value=max_value - log_entry.value,
-            battery_value=log_entry.battery,
+        log_entry = resolve_created_at(log_entry, utc_now())
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Error processing request: {str(e)}",
         )
 
-        # Add and commit the log entry to the database
-        db.add(sensor_data)
-        db.commit()
-        db.refresh(sensor_data)
-        return {"message": "Request logged successfully", "id": sensor_data.id}
+    if INGEST_BUFFERED:
+        # write-behind mode: the background flush does the database work
+        try:
+            await ingest_buffer.submit(log_entry)
+        except IngestBufferFull as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=str(e),
+                headers={"Retry-After": "1"},
+            )
+        return {"message": "Request queued", "id": None}
+
+    try:
+        # registers unknown sensors and skips readings that were already stored
+        [id] = await write_readings(db, [log_entry])
+        if id is None:
+            return {"message": "Duplicate reading ignored", "id": None}
+        return {"message": "Request logged successfully", "id": id}
 
     except SQLAlchemyError as e:
-        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}",
@@ -78,102 +82,220 @@ async def log_request(log_entry: SensorDataRequest):
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Error processing request: {str(e)}",
         )
-    finally:
-        db.close()
 
 
-@router.get("/sensor-data")
-async def get_sensor_data(params: SensorDataFilters = Depends()):
+@router.post("/log/batch")
+async def log_batch_request(
+    entries: list[dict[str, Any]] = Body(...), db: AsyncSession = Depends(get_db)
+):
+    """Logs many readings, possibly from different sensors, in one transaction.
+
+    Every item is validated on its own so one bad reading does not reject the
+    whole batch; the response carries a result per item, in request order.
+    """
+    if len(entries) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch exceeds the maximum of {MAX_BATCH_SIZE} readings",
+        )
+
+    received_at = utc_now()
+    results: list[dict] = [None] * len(entries)
+    valid = []
+    for index, entry in enumerate(entries):
+        try:
+            log_entry = SensorDataRequest.model_validate(entry)
+            valid.append((index, resolve_created_at(log_entry, received_at)))
+        except ValidationError as e:
+            results[index] = {
+                "index": index,
+                "status": "error",
+                "detail": e.errors(include_url=False),
+            }
+        except ValueError as e:
+            results[index] = {"index": index, "status": "error", "detail": str(e)}
+
     try:
-        db = SessionLocal()
+        ids = await write_readings(db, [log_entry for _, log_entry in valid])
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database error: {str(e)}",
+        )
 
-        total_sensors = db.query(Sensors).count()
-        total_active_sensors = db.query(Sensors).filter(Sensors.active == True).count()
+    for (index, _), id in zip(valid, ids):
+        if id is None:
+            results[index] = {"index": index, "status": "duplicate", "id": None}
+        else:
+            results[index] = {"index": index, "status": "ok", "id": id}
+
+    accepted = sum(id is not None for id in ids)
+    return {
+        "message": "Batch logged",
+        "accepted": accepted,
+        "duplicates": len(ids) - accepted,
+        "rejected": len(entries) - len(ids),
+        "results": results,
+    }
+
+
+@router.post("/log/binary")
+async def log_binary_request(request: Request, db: AsyncSession = Depends(get_db)):
+    """Logs a compact binary upload (see payload.py) from a single sensor."""
+    received_at = utc_now()
+    try:
+        header, entries = decode_payload(await request.body())
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Error processing request: {str(e)}",
+        )
+    if header.count > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch exceeds the maximum of {MAX_BATCH_SIZE} readings",
+        )
 
-        # Create a subquery using a window function to pick the latest record per sensor.
-        subq = db.query(
-            SensorData,
-            func.row_number()
-            .over(
-                partition_by=SensorData.sensor_id, order_by=SensorData.created_at.desc()
-            )
-            .label("rn"),
-        ).subquery()
-
-        # Query only the latest record per sensor by filtering on rn == 1.
-        query = (
-            db.query(
-                subq.c.id,
-                subq.c.sensor_id,
-                subq.c.value,
-                subq.c.created_at,
-                subq.c.battery_value,
-                Sensors.name.label("name"),
-                Sensors.status.label("status"),
-                Sensors.active.label("active"),
-            )
-            .join(Sensors, Sensors.id == subq.c.sensor_id)
-            .filter(subq.c.rn == 1)
+    try:
+        ids = await write_readings(db, plausible_readings(entries, received_at))
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database error: {str(e)}",
         )
+    accepted = sum(id is not None for id in ids)
+    return {
+        "message": "Batch logged",
+        "seq": header.seq,
+        "accepted": accepted,
+        "duplicates": len(ids) - accepted,
+        "rejected": header.count - len(ids),
+    }
+
+
+@router.get("/sensor-data")
+async def get_sensor_data(
+    request: Request,
+    response: Response,
+    params: SensorDataFilters = Depends(),
+    db: AsyncSession = Depends(get_db),
+):
+    """Lists sensors with their latest reading, one page at a time.
+
+    Pages are keyed on the sort column plus the sensor id: pass the
+    ``next_cursor`` or ``prev_cursor`` of a response as ``cursor`` to move on.
+    ``page`` still works for the first page or a jump, using OFFSET. The list
+    and all three totals come from a single statement.
+    """
+    etag = data_versions.etag(data_versions.version, request)
+    if etag_matches(etag, request):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
+    try:
+        # The latest reading of every sensor is kept on Sensors by the ingest
+        # path, so this never touches SensorData.
+        query = select(Sensors).filter(Sensors.last_seen_at.is_not(None))
 
         # Apply date filters if provided.
         if params.start_date:
-            query = query.filter(subq.c.created_at >= params.start_date)
+            query = query.filter(
+                Sensors.last_seen_at >= to_naive_utc(params.start_date)
+            )
         if params.end_date:
-            query = query.filter(subq.c.created_at <= params.end_date)
+            query = query.filter(Sensors.last_seen_at <= to_naive_utc(params.end_date))
 
         # Apply active filter.
         # If the client does not send an "active" filter, default to active=True.
         if params.active is not None:
             query = query.filter(Sensors.active == params.active)
 
-        # Apply sorting.
-        if params.sort_by:
-            if params.sort_by == "name":
-                sort_field = Sensors.name
-            elif params.sort_by in ["value", "created_at"]:
-                # Access columns from the subquery for SensorData fields.
-                sort_field = getattr(subq.c, params.sort_by)
-            else:
-                sort_field = subq.c.id
+        if params.search:
+            # search by name and id, served by a trigram index
+            query = query.filter(sensor_search(params.search, db.bind.dialect.name))
 
-            sort_field = (
-                sort_field.desc() if params.order == "desc" else sort_field.asc()
-            )
-            query = query.order_by(sort_field)
+        filtered = query.cte("filtered")
+        listed = aliased(Sensors, filtered)
+
+        # Apply sorting, with the id as tie breaker for the cursors.
+        if params.sort_by:
+            sort_field = {
+                "name": listed.name,
+                "value": listed.last_value,
+                "created_at": listed.last_seen_at,
+            }.get(params.sort_by, listed.id)
+            descending = params.order == "desc"
         else:
             # Default sorting by last updated.
-            query = query.order_by(desc(subq.c.created_at))
-
-        if params.search:
-            # search by name and id
-            query = query.filter(
-                Sensors.name.ilike(f"%{params.search}%")
-                | Sensors.id.ilike(f"%{params.search}%")
+            sort_field = listed.last_seen_at
+            descending = True
+
+        totals = (
+            select(func.count()).select_from(filtered).scalar_subquery(),
+            select(func.count()).select_from(Sensors).scalar_subquery(),
+            select(func.count())
+            .select_from(Sensors)
+            .where(Sensors.active == True)
+            .scalar_subquery(),
+        )
+        page_query = select(listed, *totals)
+        if params.cursor:
+            value, id, direction = decode_cursor(params.cursor, sort_field)
+            # a previous page is the next page in reverse order
+            backwards = direction == PREV
+            page_query = page_query.filter(
+                after(sort_field, listed.id, value, id, descending != backwards)
             )
+        else:
+            backwards = False
+            page_query = page_query.offset((params.page - 1) * params.page_size)
 
-        total = query.count()
+        if descending != backwards:
+            page_query = page_query.order_by(sort_field.desc(), listed.id.desc())
+        else:
+            page_query = page_query.order_by(sort_field.asc(), listed.id.asc())
 
-        # Apply pagination.
-        logs = (
-            query.offset((params.page - 1) * params.page_size)
-            .limit(params.page_size)
-            .all()
-        )
+        # one extra row tells whether there is another page in that direction
+        rows = (await db.execute(page_query.limit(params.page_size + 1))).all()
+        more = len(rows) > params.page_size
+        rows = rows[: params.page_size]
+        if backwards:
+            rows.reverse()
+
+        if rows:
+            _, total, total_sensors, total_active_sensors = rows[0]
+        else:
+            # past the end, the totals have to be counted on their own
+            total, total_sensors, total_active_sensors = (
+                await db.execute(select(*totals))
+            ).one()
+        sensors = [row[0] for row in rows]
+
+        # coming back from a later page, or having skipped earlier ones, means
+        # there is a page in the other direction
+        has_next = more if not backwards else True
+        has_prev = more if backwards else bool(params.cursor) or params.page > 1
+        next_cursor = prev_cursor = None
+        if sensors and has_next:
+            last = sensors[-1]
+            next_cursor = encode_cursor(getattr(last, sort_field.key), last.id, NEXT)
+        if sensors and has_prev:
+            first = sensors[0]
+            prev_cursor = encode_cursor(getattr(first, sort_field.key), first.id, PREV)
 
         # Process the results.
         records = [
             {
-                "sensor_id": record.sensor_id,
-                "raw_value": record.value,
-                "value": get_value_percentage(record.value),
-                "created_at": record.created_at,
-                "status": record.status,
-                "name": record.name,
-                "active": record.active,
-                "battery_value": record.battery_value,
+                "sensor_id": sensor.id,
+                "raw_value": sensor.last_value,
+                "value": get_value_percentage(sensor.last_value),
+                "created_at": sensor.last_seen_at,
+                "status": sensor.status,
+                "name": sensor.name,
+                "active": sensor.active,
+                "battery_value": sensor.last_battery,
             }
-            for record in logs
+            for sensor in sensors
         ]
 
         return {
@@ -181,6 +303,8 @@ async def get_sensor_data(params: SensorDataFilters = Depends()):
             "total": total,
             "total_active_sensors": total_active_sensors,
             "total_sensors": total_sensors,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor,
         }
 
     except SQLAlchemyError as e:
@@ -193,69 +317,211 @@ async def get_sensor_data(params: SensorDataFilters = Depends()):
             status_code=getattr(e, "status_code", status.HTTP_400_BAD_REQUEST),
             detail=f"Error processing request: {str(e)}",
         )
-    finally:
-        db.close()
+
+
+@router.get("/sensor-data/stream")
+async def stream_sensor_events(
+    sensor_id: Optional[str] = Query(None, description="Only events of this sensor")
+):
+    """Pushes new readings and status changes as Server-Sent Events.
+
+    ``reading`` events carry a new reading, ``status`` events a sensor whose
+    status, activity or settings changed. A client that falls too far behind
+    is disconnected and should reload before listening again.
+    """
+    return stream_events(sensor_id)
 
 
 @router.get("/sensor-data/{sensor_id}")
 async def get_logs(
+    request: Request,
+    response: Response,
     sensor_id: str,
     start_date: Optional[datetime] = Query(
         None, description="Start date in ISO format"
     ),
     end_date: Optional[datetime] = Query(None, description="End date in ISO format"),
+    points: Optional[int] = Query(
+        None,
+        ge=1,
+        description="Minimum number of points wanted, longer ranges are served "
+        "from the hourly or daily rollups",
+    ),
+    max_points: Optional[int] = Query(
+        None,
+        ge=3,
+        description="Downsample the series to at most this many points (LTTB)",
+    ),
+    format: Literal["json", "ndjson", "csv"] = Query(
+        "json",
+        description="ndjson and csv stream the points after one sensor record",
+    ),
+    db: AsyncSession = Depends(get_db),
 ):
-    """Returns all log entries for a specific sensor."""
+    """Returns all log entries for a specific sensor.
+
+    With ``points`` and a start date the coarsest rollup that still has that
+    many buckets in the range is returned instead of the raw readings. With
+    ``max_points`` the series is downsampled with Largest-Triangle-Three-
+    Buckets, which keeps the peaks and dips a chart needs. The ndjson and csv
+    formats are streamed, see streaming.py.
+    """
+    etag = data_versions.etag(data_versions.sensor(sensor_id), request)
+    if etag_matches(etag, request):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
+    start_date = to_naive_utc(start_date) if start_date else None
+    end_date = to_naive_utc(end_date) if end_date else None
     try:
-        # Create a DB session
-        db = SessionLocal()
-
-        query = (
-            db.query(SensorData)
-            .options(joinedload(SensorData.sensor))
-            .filter(SensorData.sensor_id == sensor_id)
-        )
-
-        if start_date:
-            query = query.filter(SensorData.created_at >= start_date)
-        if end_date:
-            query = query.filter(SensorData.created_at <= end_date)
+        resolution = pick_resolution(start_date, end_date, points)
+        if format != "json":
+            sensor = await db.get(Sensors, sensor_id)
+            if sensor is None:
+                raise HTTPException(status_code=404, detail="Sensor not found")
+            if resolution is not None:
+                records = await get_rollup_records(
+                    db, sensor_id, resolution, start_date, end_date, max_points
+                )
+                stream = record_points(records)
+            elif max_points:
+                records = await get_raw_records(
+                    db, sensor_id, start_date, end_date, max_points
+                )
+                stream = record_points(records)
+            else:
+                stream = raw_points(sensor_id, start_date, end_date)
+            streaming_response = stream_history(
+                format, sensor_header(sensor, resolution or "raw"), stream
+            )
+            streaming_response.headers["ETag"] = etag
+            return streaming_response
+
+        if resolution is not None:
+            return {
+                "resolution": resolution,
+                "records": await get_rollup_records(
+                    db, sensor_id, resolution, start_date, end_date, max_points
+                ),
+            }
 
-        # Query all log entries for the specified sensor
-        logs = query.order_by(SensorData.created_at.asc()).all()
         return {
-            "records": [
-                {
-                    "sensor_id": sensor_id,
-                    "raw_value": log.value,
-                    "value": get_value_percentage(log.value),
-                    "created_at": log.created_at,
-                    "status": log.sensor.status,
-                    "name": log.sensor.name,
-                    "active": log.sensor.active,
-                    "description": log.sensor.description,
-                    "threshold_green": log.sensor.threshold_green,
-                    "threshold_yellow": log.sensor.threshold_yellow,
-                    "threshold_red": log.sensor.threshold_red,
-                    "sensor": log.sensor,
-                }
-                for log in logs
-            ]
+            "resolution": "raw",
+            "records": await get_raw_records(
+                db, sensor_id, start_date, end_date, max_points
+            ),
         }
     except SQLAlchemyError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}",
         )
-    finally:
-        db.close()
+
+
+async def get_raw_records(
+    db: AsyncSession,
+    sensor_id: str,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    max_points: Optional[int] = None,
+) -> list[dict]:
+    """Raw readings of a sensor, downsampled to ``max_points`` when given."""
+    sensor = await db.get(Sensors, sensor_id)
+    if sensor is None:
+        return []
+
+    query = select(SensorData.created_at, SensorData.value).filter(
+        SensorData.sensor_id == sensor_id
+    )
+
+    if start_date:
+        query = query.filter(SensorData.created_at >= start_date)
+    if end_date:
+        query = query.filter(SensorData.created_at <= end_date)
+
+    # Query all log entries for the specified sensor
+    logs = (await db.execute(query.order_by(SensorData.created_at.asc()))).all()
+    if max_points and len(logs) > max_points:
+        created_at, values = zip(*logs)
+        keep = lttb(timestamps(created_at), np.array(values), max_points)
+        logs = [logs[index] for index in keep]
+
+    return [
+        {
+            "sensor_id": sensor_id,
+            "raw_value": log.value,
+            "value": get_value_percentage(log.value),
+            "created_at": log.created_at,
+            "status": sensor.status,
+            "name": sensor.name,
+            "active": sensor.active,
+            "description": sensor.description,
+            "threshold_green": sensor.threshold_green,
+            "threshold_yellow": sensor.threshold_yellow,
+            "threshold_red": sensor.threshold_red,
+            "sensor": sensor,
+        }
+        for log in logs
+    ]
+
+
+async def get_rollup_records(
+    db: AsyncSession,
+    sensor_id: str,
+    resolution: str,
+    start_date: datetime,
+    end_date: Optional[datetime],
+    max_points: Optional[int] = None,
+) -> list[dict]:
+    """Rollup buckets of a sensor shaped like the raw records of get_logs."""
+    sensor = await db.get(Sensors, sensor_id)
+    if sensor is None:
+        return []
+
+    model, step = RESOLUTIONS[resolution]
+    query = select(model).filter(
+        model.sensor_id == sensor_id, model.bucket >= bucket_start(start_date, step)
+    )
+    if end_date:
+        query = query.filter(model.bucket <= end_date)
+
+    buckets = (await db.scalars(query.order_by(model.bucket.asc()))).all()
+    if max_points and len(buckets) > max_points:
+        keep = lttb(
+            timestamps([bucket.bucket for bucket in buckets]),
+            np.array([bucket.avg_value for bucket in buckets]),
+            max_points,
+        )
+        buckets = [buckets[index] for index in keep]
+    return [
+        {
+            "sensor_id": sensor_id,
+            "raw_value": bucket.avg_value,
+            "value": get_value_percentage(bucket.avg_value),
+            "min_value": get_value_percentage(bucket.min_value),
+            "max_value": get_value_percentage(bucket.max_value),
+            "count": bucket.count,
+            "created_at": bucket.bucket,
+            "battery_value": bucket.last_battery,
+            "status": sensor.status,
+            "name": sensor.name,
+            "active": sensor.active,
+            "description": sensor.description,
+            "threshold_green": sensor.threshold_green,
+            "threshold_yellow": sensor.threshold_yellow,
+            "threshold_red": sensor.threshold_red,
+            "sensor": sensor,
+        }
+        for bucket in buckets
+    ]
 
 
 @router.patch("/sensor-data/{sensor_id}")
-async def update_sensor(sensor_id: str, sensor_update: SensorRequest):
+async def update_sensor(
+    sensor_id: str, sensor_update: SensorRequest, db: AsyncSession = Depends(get_db)
+):
     try:
-        db = SessionLocal()
-        sensor = db.query(Sensors).filter(Sensors.id == sensor_id).first()
+        sensor = await db.get(Sensors, sensor_id)
         if not sensor:
             raise HTTPException(status_code=404, detail="Sensor not found")
 
@@ -264,10 +530,21 @@ async def update_sensor(sensor_id: str, sensor_update: SensorRequest):
         for key, value in update_data.items():
             setattr(sensor, key, value)
 
-        db.commit()
-        db.refresh(sensor)
+        await db.commit()
+        await db.refresh(sensor)
+        sensor_id_cache.discard_sensor(sensor.id)
+        data_versions.bump(sensor.id)
+        if broker.subscribers:
+            broker.publish(
+                "status",
+                status_event(sensor.id, sensor.name, sensor.status, sensor.active),
+            )
 
-        alert_service.run_update_alerts()
+        # new thresholds or a reactivation can change the status; the
+        # evaluation runs in the background and pushes what it changes
+        job_queue.enqueue(
+            ("reevaluate", sensor_id), lambda: reevaluate_sensor(sensor_id)
+        )
 
         return sensor
     except SQLAlchemyError as e:
@@ -275,25 +552,59 @@ async def update_sensor(sensor_id: str, sensor_update: SensorRequest):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}",
         )
-    finally:
-        db.close()
 
 
 @router.delete("/sensors/{sensor_id}")
-async def delete_sensor(sensor_id: str):
+async def delete_sensor(sensor_id: str, db: AsyncSession = Depends(get_db)):
     try:
-        db = SessionLocal()
-        sensor = db.query(Sensors).filter(Sensors.id == sensor_id).first()
+        sensor = await db.get(Sensors, sensor_id)
         if not sensor:
             raise HTTPException(status_code=404, detail="Sensor not found")
 
-        db.delete(sensor)
-        db.commit()
+        await db.delete(sensor)
+        await db.commit()
+        sensor_id_cache.discard(sensor.mac_address)
+        data_versions.bump(sensor.id)
+        alert_evaluator.forget(sensor.id)
         return {"message": "Sensor deleted successfully"}
     except SQLAlchemyError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}",
         )
-    finally:
-        db.close()
+
+
+@router.get("/stats/sensor-cache")
+async def get_sensor_cache_stats():
+    """Hit/miss counters of the MAC address -> sensor id cache."""
+    return sensor_id_cache.stats()
+
+
+@router.get("/stats/events")
+async def get_event_stats():
+    """Connected live-event subscribers and drop counters."""
+    return broker.stats()
+
+
+@router.get("/stats/alert-evaluator")
+async def get_alert_evaluator_stats():
+    """Sensors cached by the event-driven alert evaluator and its counters."""
+    return alert_evaluator.stats()
+
+
+@router.get("/stats/jobs")
+async def get_job_stats():
+    """Background job counters, including coalesced duplicates."""
+    return job_queue.stats()
+
+
+@router.get("/stats/notifications")
+async def get_notification_stats():
+    """Outbound ntfy queue depth and delivery counters."""
+    return ntfy.stats()
+
+
+@router.get("/stats/ingest-buffer")
+async def get_ingest_buffer_stats():
+    """Queue depth of the write-behind ingest buffer."""
+    return ingest_buffer.stats()
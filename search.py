@@ -0,0 +1,41 @@
+"""Substring search over sensor names and ids, for the UI typeahead.
+
+``ILIKE '%term%'`` cannot use a B-tree index. On Postgres the pg_trgm GIN
+indexes of the sensor search migration answer it directly. SQLite has no
+trigram index, so the search goes through the FTS5 trigram table created
+next to Sensors (see db_setup.py) instead.
+"""
+
+from sqlalchemy import ColumnElement, column, literal_column, or_, select, table
+
+from db_setup import Sensors
+
+# trigram indexes cannot narrow down shorter terms
+MIN_TRIGRAM_LENGTH = 3
+
+sensor_search_table = table("SensorSearch", column("rowid"))
+
+
+def like_pattern(term: str) -> str:
+    """A LIKE pattern matching ``term`` anywhere, with wildcards escaped."""
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def fts_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def sensor_search(term: str, dialect_name: str) -> ColumnElement[bool]:
+    """Filter for the sensors whose name or id contains ``term``, any case."""
+    if dialect_name == "sqlite" and len(term) >= MIN_TRIGRAM_LENGTH:
+        matches = select(sensor_search_table.c.rowid).where(
+            literal_column('"SensorSearch"').op("MATCH")(fts_phrase(term))
+        )
+        return literal_column('"Sensors".rowid').in_(matches)
+
+    pattern = like_pattern(term)
+    return or_(
+        Sensors.name.ilike(pattern, escape="\\"),
+        Sensors.id.ilike(pattern, escape="\\"),
+    )
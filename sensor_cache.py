@@ -0,0 +1,62 @@
+import time
+from collections import OrderedDict
+
+from settings import SENSOR_CACHE_SIZE, SENSOR_CACHE_TTL
+
+
+class SensorIdCache:
+    """Bounded LRU cache of MAC address -> sensor id with a per-entry TTL.
+
+    The mapping only changes when a sensor is registered, edited or deleted,
+    so the ingest path can skip the sensor lookup for almost every reading.
+    """
+
+    def __init__(
+        self, max_size: int = SENSOR_CACHE_SIZE, ttl: float = SENSOR_CACHE_TTL
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+
+    def get(self, mac_address: str) -> str | None:
+        entry = self._entries.get(mac_address)
+        if entry is None or entry[1] < time.monotonic():
+            if entry is not None:
+                del self._entries[mac_address]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(mac_address)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, mac_address: str, sensor_id: str):
+        self._entries[mac_address] = (sensor_id, time.monotonic() + self.ttl)
+        self._entries.move_to_end(mac_address)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, *mac_addresses: str):
+        for mac_address in mac_addresses:
+            self._entries.pop(mac_address, None)
+
+    def discard_sensor(self, sensor_id: str):
+        """Drops every entry pointing at a sensor id."""
+        stale = [mac for mac, (id, _) in self._entries.items() if id == sensor_id]
+        self.discard(*stale)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+sensor_id_cache = SensorIdCache()
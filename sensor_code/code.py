@@ -8,6 +8,7 @@ from log import logger
 from ioregistry import IOManager
 from enums import WakeError
 from sleep import deep_sleep
+from readingbuffer import ReadingBuffer
 
 
 class TryThing:
@@ -57,6 +58,7 @@ def main():
 
     with TryThing(wake_error=WakeError.SLEEP):
         logger.log(f"Going to sleep for {SLEEP_TIME_MINS}")
+        ReadingBuffer().advance_clock(SLEEP_TIME_MINS)
         time_alarm = alarm.time.TimeAlarm(
             monotonic_time=time.monotonic() + SLEEP_TIME_MINS
         )
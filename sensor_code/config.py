@@ -5,15 +5,27 @@ import wifi
 
 mac = wifi.radio.mac_address
 MAC_ADDRESS = ":".join("{:02X}".format(b) for b in mac)
+MAC_BYTES = bytes(mac)
 
 
 API_URL = getenv("API_URL", "")
+BINARY_API_URL = getenv("BINARY_API_URL", f"{API_URL}/binary")
+# Send over UDP instead of HTTP when UDP_PORT is set, see transmit.send_datagram.
+UDP_HOST = getenv("UDP_HOST", "")
+UDP_PORT = getenv("UDP_PORT", 0)
+UDP_KEY = getenv("UDP_KEY", "")
 WIFI_SSID = getenv("WIFI_SSID", "")
 WIFI_PW = getenv("WIFI_PW", "")
 
 SLEEP_TIME_MINS = getenv("SLEEP_TIME_MINS", 30) * 60 
 LOW_BATT_VALUE = 33200  # somewhere around 3.4 volts
 
+# Readings are buffered across deep sleep and sent together every N wakes,
+# or right away when the soil value moved by SEND_VALUE_DELTA since the last
+# send or the battery is low.
+SEND_EVERY_N_WAKES = getenv("SEND_EVERY_N_WAKES", 4)
+SEND_VALUE_DELTA = getenv("SEND_VALUE_DELTA", 2000)
+
 # SMD Expansion Board Pins
 # BATT_REF_PIN = board.D1
 # EXT_PWR_PIN = board.D0 # Gate pin
@@ -28,6 +40,7 @@ SCL_PIN = board.SCL
 WRITE_TO_STORAGE = False
 WRITE_TO_UART = True
 LOGGER_FILEPATH = "log.txt"
+READINGS_FILEPATH = "readings.bin"
 
 try:
     mount = storage.getmount("/")
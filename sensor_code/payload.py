@@ -0,0 +1,50 @@
+import hashlib
+import struct
+
+# Version 1 of the binary upload format, decoded by the server's payload.py.
+VERSION = 1
+# version, flags, MAC address, seq of the first reading, clock when sent, count
+HEADER_FORMAT = "<BB6sIIH"
+# clock when measured, raw soil value, raw battery value
+READING_FORMAT = "<IHH"
+NO_BATTERY = 0xFFFF
+
+# UDP datagrams carry a truncated HMAC-SHA256 of the payload, see the
+# server's udp_ingest.py; the ack is version, seq, number of readings accepted.
+AUTH_TAG_SIZE = 8
+ACK_FORMAT = "<BIH"
+
+
+def encode_payload(mac, seq, sent_at, readings) -> bytes:
+    """Packs buffered readings into one binary upload."""
+    readings = list(readings)
+    header_size = struct.calcsize(HEADER_FORMAT)
+    reading_size = struct.calcsize(READING_FORMAT)
+    data = bytearray(header_size + len(readings) * reading_size)
+    data[:header_size] = struct.pack(
+        HEADER_FORMAT, VERSION, 0, bytes(mac), seq, sent_at, len(readings)
+    )
+    offset = header_size
+    for reading in readings:
+        battery = NO_BATTERY if reading.battery is None else reading.battery
+        data[offset : offset + reading_size] = struct.pack(
+            READING_FORMAT, reading.clock, reading.value, battery
+        )
+        offset += reading_size
+    return bytes(data)
+
+
+def _sha256(data) -> bytes:
+    digest = hashlib.new("sha256")
+    digest.update(data)
+    return digest.digest()
+
+
+def auth_tag(key, data) -> bytes:
+    """Truncated HMAC-SHA256, there is no hmac module on CircuitPython."""
+    block_size = 64
+    if len(key) > block_size:
+        key = _sha256(key)
+    key = key + bytes(block_size - len(key))
+    inner = _sha256(bytes(b ^ 0x36 for b in key) + data)
+    return _sha256(bytes(b ^ 0x5C for b in key) + inner)[:AUTH_TAG_SIZE]
@@ -0,0 +1,144 @@
+import os
+import struct
+import time
+
+from alarm import sleep_memory
+
+from config import READINGS_FILEPATH, WRITE_TO_STORAGE
+from log import logger
+
+# sleep_memory[0] holds the WakeError, the buffer starts after it.
+MEM_OFFSET = 4
+MAGIC = 0x5343
+# magic, head, count, clock, last_sent_value, next_seq
+HEADER_FORMAT = "<HHHIHI"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+# clock, soil value, battery value
+RECORD_FORMAT = "<IHH"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+CAPACITY = 96
+MEM_SIZE = HEADER_SIZE + CAPACITY * RECORD_SIZE
+
+
+class Reading:
+    def __init__(self, clock, value, battery):
+        self.clock = clock
+        self.value = value
+        self.battery = battery
+
+
+class ReadingBuffer:
+    """Ring buffer of readings that survives deep sleep.
+
+    Lives in alarm.sleep_memory, or in a file on flash when sleep memory is
+    too small. The device keeps its own clock in seconds, advanced by the
+    sleep duration before every deep sleep, so readings can be timestamped
+    relative to the moment they are finally sent.
+    """
+
+    def __init__(self):
+        self.file_backed = len(sleep_memory) < MEM_OFFSET + MEM_SIZE
+        # without sleep memory or a writable flash nothing survives deep sleep
+        self.persistent = not self.file_backed or WRITE_TO_STORAGE
+        if self.file_backed:
+            self.mem = self._load_file()
+        else:
+            self.mem = sleep_memory
+
+        magic, head, count, clock, last_sent_value, next_seq = self._header()
+        if magic != MAGIC:
+            logger.log("Initializing reading buffer")
+            head, count, clock, last_sent_value = 0, 0, 0, 0
+            # The server ignores sequence numbers it has already stored, so a
+            # counter lost with power must not restart where the old one did.
+            next_seq = int.from_bytes(os.urandom(4), "little") & 0x7FFFFFFF
+        self.head = head
+        self.count = count
+        self.clock = clock
+        self.last_sent_value = last_sent_value
+        # sequence number the next appended reading gets
+        self.next_seq = next_seq
+
+    def _load_file(self):
+        mem = bytearray(MEM_OFFSET + MEM_SIZE)
+        try:
+            with open(READINGS_FILEPATH, "rb") as file:
+                data = file.read()
+            mem[: len(data)] = data[: len(mem)]
+        except OSError:
+            pass
+        return mem
+
+    def _header(self):
+        start = MEM_OFFSET
+        header = bytes(self.mem[start : start + HEADER_SIZE])
+        return struct.unpack(HEADER_FORMAT, header)
+
+    def save(self):
+        """Writes the header back, and the whole buffer when file backed."""
+        start = MEM_OFFSET
+        self.mem[start : start + HEADER_SIZE] = struct.pack(
+            HEADER_FORMAT,
+            MAGIC,
+            self.head,
+            self.count,
+            self.clock,
+            self.last_sent_value,
+            self.next_seq,
+        )
+        if self.file_backed and WRITE_TO_STORAGE:
+            with open(READINGS_FILEPATH, "wb") as file:
+                file.write(self.mem)
+
+    def now(self) -> int:
+        """Seconds on the device clock."""
+        return self.clock + int(time.monotonic())
+
+    def advance_clock(self, sleep_time):
+        """Called right before a deep sleep of ``sleep_time`` seconds."""
+        self.clock = self.now() + int(sleep_time)
+        self.save()
+
+    def _record_offset(self, index):
+        return MEM_OFFSET + HEADER_SIZE + index * RECORD_SIZE
+
+    def append(self, value, battery):
+        """Stores a reading, dropping the oldest one when full."""
+        if self.count == CAPACITY:
+            logger.log("Reading buffer full, dropping oldest reading")
+            self.head = (self.head + 1) % CAPACITY
+            self.count -= 1
+        offset = self._record_offset((self.head + self.count) % CAPACITY)
+        self.mem[offset : offset + RECORD_SIZE] = struct.pack(
+            RECORD_FORMAT, self.now(), int(value), int(battery)
+        )
+        self.count += 1
+        self.next_seq += 1
+        self.save()
+
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest stored reading."""
+        return self.next_seq - self.count
+
+    def readings(self):
+        for i in range(self.count):
+            offset = self._record_offset((self.head + i) % CAPACITY)
+            record = bytes(self.mem[offset : offset + RECORD_SIZE])
+            yield Reading(*struct.unpack(RECORD_FORMAT, record))
+
+    def clear(self, last_sent_value):
+        """Forgets every stored reading after a successful send."""
+        self.head = 0
+        self.count = 0
+        self.last_sent_value = int(last_sent_value)
+        self.save()
+
+    def should_send(self, value, battery, every_n, value_delta, low_batt) -> bool:
+        if not self.persistent:
+            return True
+        if self.count >= every_n or self.count == CAPACITY:
+            return True
+        if abs(value - self.last_sent_value) >= value_delta:
+            return True
+        return battery < low_batt
@@ -2,10 +2,12 @@ import alarm
 import time
 
 from log import logger
+from readingbuffer import ReadingBuffer
 
 
 def deep_sleep(sleep_time, dios):
     logger.log(f"Going to sleep for {sleep_time}")
+    ReadingBuffer().advance_clock(sleep_time)
     monotonic_time = time.monotonic() + sleep_time
     logger.log(f"Alarm time {monotonic_time=}")
     time_alarm = alarm.time.TimeAlarm(monotonic_time=monotonic_time)
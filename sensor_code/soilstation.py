@@ -1,10 +1,21 @@
 from alarm import sleep_memory
 from analogio import AnalogIn
 
-from config import BATT_REF_PIN, LOW_BATT_VALUE, SDA_PIN, MAC_ADDRESS
+from config import (
+    BATT_REF_PIN,
+    BINARY_API_URL,
+    LOW_BATT_VALUE,
+    MAC_BYTES,
+    SDA_PIN,
+    SEND_EVERY_N_WAKES,
+    SEND_VALUE_DELTA,
+    UDP_PORT,
+)
 from enums import WakeError
 from ioregistry import IOManager
 from log import logger
+from payload import encode_payload
+from readingbuffer import ReadingBuffer
 
 
 class SoilStation:
@@ -25,10 +36,27 @@ class SoilStation:
             sleep_memory[0] = WakeError.MEASURE
             raise e
 
-        data = {"value": soil_value, "battery": batt_value, "mac_address": MAC_ADDRESS}
-        from transmit import send_data
+        buffer = ReadingBuffer()
+        buffer.append(soil_value, batt_value)
+        if not buffer.should_send(
+            soil_value, batt_value, SEND_EVERY_N_WAKES, SEND_VALUE_DELTA, LOW_BATT_VALUE
+        ):
+            logger.log(f"buffered reading {buffer.count}/{SEND_EVERY_N_WAKES}")
+            return
 
-        send_data(data)
+        data = encode_payload(
+            MAC_BYTES, buffer.first_seq, buffer.now(), buffer.readings()
+        )
+        # a failed send raises and leaves the readings for the next wake
+        if UDP_PORT:
+            from transmit import send_datagram
+
+            send_datagram(data, buffer.first_seq)
+        else:
+            from transmit import send_data
+
+            send_data(data, url=BINARY_API_URL)
+        buffer.clear(soil_value)
 
     def measure_batt(self) -> float:
         logger.log("measuring battery")
@@ -1,17 +1,13 @@
 import socketpool
-import ssl
 import wifi
 from alarm import sleep_memory
 
-import adafruit_requests
-
-from config import API_URL, WIFI_SSID, WIFI_PW
+from config import API_URL, WIFI_SSID, WIFI_PW, UDP_HOST, UDP_PORT, UDP_KEY
 from log import logger
 from enums import WakeError
 
 
-def send_data(data, timeout=10):
-    """Connect to wifi and send data"""
+def connect_wifi():
     try:
         logger.log("Connecting to WIFI")
         wifi.radio.tx_power = 15
@@ -22,12 +18,24 @@ def send_data(data, timeout=10):
         sleep_memory[0] = WakeError.WIFI_CONN
         raise e
 
+
+def send_data(data, timeout=10, url=API_URL):
+    """Connect to wifi and send data"""
+    import ssl
+    import adafruit_requests
+
+    connect_wifi()
+
     pool = socketpool.SocketPool(wifi.radio)
     requests = adafruit_requests.Session(pool, ssl.create_default_context())
 
     try:
-        logger.log(f"sending data: {data} to {API_URL}")
-        response = requests.post(API_URL, json=data, timeout=timeout)
+        logger.log(f"sending data: {data} to {url}")
+        if isinstance(data, bytes):
+            headers = {"Content-Type": "application/octet-stream"}
+            response = requests.post(url, data=data, headers=headers, timeout=timeout)
+        else:
+            response = requests.post(url, json=data, timeout=timeout)
         if response.status_code != 200:
             logger.log(response.status_code)
             logger.log(response.content)
@@ -39,3 +47,45 @@ def send_data(data, timeout=10):
     except Exception as e:
         print(e)
         raise e
+
+
+def send_datagram(payload, seq, timeout=2, attempts=3):
+    """Connect to wifi, send a binary payload over UDP and wait for its ack.
+
+    Skips the TCP/TLS handshakes and HTTP framing of send_data. The datagram
+    is resent up to ``attempts`` times until the server acks ``seq``.
+    """
+    from payload import ACK_FORMAT, AUTH_TAG_SIZE, auth_tag
+    import struct
+
+    connect_wifi()
+
+    key = UDP_KEY.encode()
+    packet = payload + auth_tag(key, payload)
+    ack_size = struct.calcsize(ACK_FORMAT)
+    buffer = bytearray(ack_size + AUTH_TAG_SIZE)
+
+    pool = socketpool.SocketPool(wifi.radio)
+    sock = pool.socket(pool.AF_INET, pool.SOCK_DGRAM)
+    sock.settimeout(timeout)
+    try:
+        for attempt in range(attempts):
+            logger.log(f"sending datagram {seq=} to {UDP_HOST}:{UDP_PORT} {attempt=}")
+            sock.sendto(packet, (UDP_HOST, UDP_PORT))
+            try:
+                size, _ = sock.recvfrom_into(buffer)
+            except OSError:
+                continue
+            ack = bytes(buffer[:ack_size])
+            if size != len(buffer) or bytes(buffer[ack_size:]) != auth_tag(key, ack):
+                continue
+            _, acked_seq, _ = struct.unpack(ACK_FORMAT, ack)
+            if acked_seq == seq:
+                logger.log("sending complete")
+                sleep_memory[0] = 0
+                return
+    finally:
+        sock.close()
+
+    sleep_memory[0] = WakeError.TRANSMIT
+    raise OSError(f"no ack for datagram {seq}")
@@ -0,0 +1,166 @@
+"""Streamed responses: a sensor's history as NDJSON or CSV and live events.
+
+In the history formats the first record describes the sensor, every
+following one is a single point. Raw readings are read through a server-side
+cursor in chunks of STREAM_CHUNK_ROWS, so memory stays flat however long the
+range is.
+"""
+
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, Iterable, Optional
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from db_setup import AsyncSessionLocal, SensorData, Sensors
+from pubsub import broker
+from settings import EVENT_KEEPALIVE_SECONDS, STREAM_CHUNK_ROWS
+from utils import get_value_percentage
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# per-sensor fields of the JSON records, sent once in the header record
+SENSOR_FIELDS = {
+    "sensor_id",
+    "status",
+    "name",
+    "active",
+    "description",
+    "threshold_green",
+    "threshold_yellow",
+    "threshold_red",
+    "sensor",
+}
+
+
+def sensor_header(sensor: Sensors, resolution: str) -> dict:
+    return {
+        "sensor_id": sensor.id,
+        "name": sensor.name,
+        "status": sensor.status,
+        "active": sensor.active,
+        "description": sensor.description,
+        "threshold_green": sensor.threshold_green,
+        "threshold_yellow": sensor.threshold_yellow,
+        "threshold_red": sensor.threshold_red,
+        "resolution": resolution,
+    }
+
+
+def _point(record: dict) -> dict:
+    point = {"created_at": record["created_at"].isoformat()}
+    point.update(
+        (k, v) for k, v in record.items() if k not in SENSOR_FIELDS | {"created_at"}
+    )
+    return point
+
+
+async def raw_points(
+    sensor_id: str, start_date: Optional[datetime], end_date: Optional[datetime]
+) -> AsyncIterator[dict]:
+    """Raw readings of a sensor, oldest first, from a server-side cursor.
+
+    Uses its own session because it runs while the response is being sent,
+    after the request's session is gone.
+    """
+    query = select(SensorData.created_at, SensorData.value).filter(
+        SensorData.sensor_id == sensor_id
+    )
+    if start_date:
+        query = query.filter(SensorData.created_at >= start_date)
+    if end_date:
+        query = query.filter(SensorData.created_at <= end_date)
+    query = query.order_by(SensorData.created_at.asc()).execution_options(
+        yield_per=STREAM_CHUNK_ROWS
+    )
+
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query)
+        async for created_at, value in result:
+            yield {
+                "created_at": created_at.isoformat(),
+                "raw_value": value,
+                "value": get_value_percentage(value),
+            }
+
+
+async def record_points(records: Iterable[dict]) -> AsyncIterator[dict]:
+    """Points of records already built for the JSON response."""
+    for record in records:
+        yield _point(record)
+
+
+async def _encode(
+    format: str, header: dict, points: AsyncIterable[dict]
+) -> AsyncIterator[str]:
+    if format == "ndjson":
+        yield json.dumps({"sensor": header}) + "\n"
+    else:
+        # a comment line, skipped by e.g. pandas.read_csv(comment="#")
+        yield "# " + json.dumps(header) + "\n"
+
+    buffer = io.StringIO()
+    writer = None
+    rows = 0
+    async for point in points:
+        if format == "ndjson":
+            buffer.write(json.dumps(point) + "\n")
+        else:
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(point))
+                writer.writeheader()
+            writer.writerow(point)
+        rows += 1
+        if rows % STREAM_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_history(
+    format: str, header: dict, points: AsyncIterable[dict]
+) -> StreamingResponse:
+    filename = f"{header['sensor_id']}.{format}"
+    return StreamingResponse(
+        _encode(format, header, points),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'inline; filename="{filename}"'},
+    )
+
+
+async def _server_sent_events(sensor_id: Optional[str]) -> AsyncIterator[str]:
+    subscription = broker.subscribe()
+    try:
+        # tells EventSource how long to wait before reconnecting
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    subscription.queue.get(), EVENT_KEEPALIVE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if message is None:
+                # dropped as too slow, or shutting down
+                return
+            event, data = message
+            if sensor_id is not None and data.get("sensor_id") != sensor_id:
+                continue
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def stream_events(sensor_id: Optional[str] = None) -> StreamingResponse:
+    """Server-Sent Events of the broker, optionally for a single sensor."""
+    return StreamingResponse(
+        _server_sent_events(sensor_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,88 @@
+"""UDP datagram ingest, a low-energy alternative to POST /log/binary.
+
+A datagram is a binary payload (see payload.py) followed by an
+``AUTH_TAG_SIZE`` byte truncated HMAC-SHA256 of the payload, keyed with
+UDP_INGEST_KEY. Once the readings are committed the listener answers with an
+ack carrying the payload's sequence number, authenticated the same way.
+Datagrams that fail to authenticate or decode are dropped without an answer.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import logging
+import struct
+
+from db_setup import AsyncSessionLocal
+from ingest import plausible_readings, write_readings
+from payload import VERSION, decode_payload
+from settings import UDP_INGEST_HOST, UDP_INGEST_KEY, UDP_INGEST_PORT
+from utils import utc_now
+
+log = logging.getLogger(__name__)
+
+AUTH_TAG_SIZE = 8
+# version, seq of the first reading, number of readings accepted
+ACK = struct.Struct("<BIH")
+
+
+def auth_tag(key: bytes, data: bytes) -> bytes:
+    return hmac.new(key, data, hashlib.sha256).digest()[:AUTH_TAG_SIZE]
+
+
+class IngestProtocol(asyncio.DatagramProtocol):
+    def __init__(self, key: bytes):
+        self.key = key
+        self.transport: asyncio.DatagramTransport | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        payload, tag = data[:-AUTH_TAG_SIZE], data[-AUTH_TAG_SIZE:]
+        if len(data) <= AUTH_TAG_SIZE or not hmac.compare_digest(
+            tag, auth_tag(self.key, payload)
+        ):
+            log.warning("Dropping unauthenticated datagram from %s", addr)
+            return
+        try:
+            header, entries = decode_payload(payload)
+        except ValueError as e:
+            log.warning("Dropping malformed datagram from %s: %s", addr, e)
+            return
+
+        task = asyncio.create_task(self._ingest(header.seq, entries, addr))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _ingest(self, seq: int, entries, addr):
+        received_at = utc_now()
+        try:
+            async with AsyncSessionLocal() as db:
+                ids = await write_readings(db, plausible_readings(entries, received_at))
+        except Exception:
+            # no ack, the sensor retries
+            log.exception("Failed to write datagram from %s", addr)
+            return
+
+        # retries of a stored payload are acked too, with nothing accepted
+        ack = ACK.pack(VERSION, seq, sum(id is not None for id in ids))
+        self.transport.sendto(ack + auth_tag(self.key, ack), addr)
+
+    async def drain(self):
+        """Waits for the datagrams that are still being written."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def start_udp_ingest() -> tuple[asyncio.DatagramTransport, IngestProtocol]:
+    if not UDP_INGEST_KEY:
+        raise RuntimeError("UDP_INGEST_KEY must be set to enable UDP ingest")
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: IngestProtocol(UDP_INGEST_KEY.encode()),
+        local_addr=(UDP_INGEST_HOST, UDP_INGEST_PORT),
+    )
+    log.info("UDP ingest listening on %s:%s", UDP_INGEST_HOST, UDP_INGEST_PORT)
+    return transport, protocol
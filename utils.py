@@ -1,6 +1,20 @@
+from datetime import datetime, timezone
+
 from settings import MAX_ANALOG_VALUE
 
 
 def get_value_percentage(value:float) -> float:
     new_value = (value / MAX_ANALOG_VALUE) * 100
-    return round(new_value,2)
\ No newline at end of file
+    return round(new_value,2)
+
+
+def utc_now() -> datetime:
+    """Current UTC time without tzinfo, as stored in SensorData.created_at."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def to_naive_utc(value: datetime) -> datetime:
+    """Converts an aware datetime to naive UTC; naive values pass through."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
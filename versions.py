@@ -0,0 +1,57 @@
+import hashlib
+import secrets
+import time
+
+from fastapi import Request, Response, status
+
+from settings import ETAG_MAX_AGE_SECONDS
+
+
+class DataVersions:
+    """In-process write counters behind the ETags of the read endpoints.
+
+    The global version moves on every write, a sensor's version on every
+    write touching that sensor. ETags also include a random id of this
+    process, so counters restarting at 0 never repeat an old tag, and a time
+    bucket of ETAG_MAX_AGE_SECONDS, so changes made outside this process (the
+    alert service, rollups) show up within that time.
+    """
+
+    def __init__(self, max_age: float = ETAG_MAX_AGE_SECONDS):
+        self.max_age = max_age
+        self.boot_id = secrets.token_hex(8)
+        self.version = 0
+        self._sensors: dict[str, int] = {}
+
+    def bump(self, *sensor_ids: str):
+        self.version += 1
+        for sensor_id in sensor_ids:
+            self._sensors[sensor_id] = self.version
+
+    def sensor(self, sensor_id: str) -> int:
+        return self._sensors.get(sensor_id, 0)
+
+    def etag(self, version: int, request: Request) -> str:
+        """Weak ETag of a response at ``version``, distinct per query string."""
+        bucket = int(time.time() // self.max_age) if self.max_age > 0 else 0
+        key = (
+            f"{self.boot_id}:{version}:{bucket}:{request.url.path}?{request.url.query}"
+        )
+        return f'W/"{hashlib.blake2b(key.encode(), digest_size=8).hexdigest()}"'
+
+
+def etag_matches(etag: str, request: Request) -> bool:
+    """Whether the request's If-None-Match already names ``etag``."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = {tag.strip() for tag in if_none_match.split(",")}
+    # If-None-Match uses weak comparison
+    return "*" in tags or etag in tags or etag.removeprefix("W/") in tags
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+data_versions = DataVersions()